@@ -0,0 +1,214 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import metrics
+from stages import CHART_WORKERS
+
+load_dotenv()
+
+# CodeGen runs allowed to wait for a chart thread; beyond this new runs are shed
+CHART_QUEUE_MAX = int(os.getenv("CHART_QUEUE_MAX", "6"))
+# Shed runs still get their stats (200, chart left out) instead of a 503
+ADMISSION_DEGRADE = os.getenv("ADMISSION_DEGRADE", "true").lower() in ("1", "true", "yes")
+# New CodeGen runs per client: sustained rate per minute and burst
+CLIENT_CHART_RATE = float(os.getenv("CLIENT_CHART_RATE", "6"))
+CLIENT_CHART_BURST = int(os.getenv("CLIENT_CHART_BURST", "3"))
+# Use the first X-Forwarded-For hop as the client address (only behind a trusted proxy)
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+ADMISSION_MAX_CLIENTS = 10000
+# Retry-After before any run has finished (seconds)
+DEFAULT_RUN_SECONDS = 60.0
+EWMA_ALPHA = 0.2
+
+# Client of the HTTP request being served; unset for background work such as jobs
+current_client: contextvars.ContextVar = contextvars.ContextVar("admission_client", default=None)
+
+
+class ChartRejected(Exception):
+    """A CodeGen run was refused for `client`; `status` is the HTTP status to answer with if not degrading"""
+
+    def __init__(self, reason: str, status: int, retry_after: int, client: Optional[str] = None):
+        super().__init__(f"Chart generation {reason.replace('_', ' ')}, retry in {retry_after}s")
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+        self.client = client
+
+    def headers(self) -> dict:
+        return {"Retry-After": str(self.retry_after)}
+
+
+class RateLimiter():
+    """Token bucket per client: `rate` per minute sustained, up to `burst` at once"""
+
+    def __init__(self, rate: float = CLIENT_CHART_RATE, burst: int = CLIENT_CHART_BURST,
+                 max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.per_second = rate / 60.0
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # client -> (tokens, updated_at)
+
+    def _tokens(self, client: str, now: float) -> float:
+        # caller holds self._lock
+        tokens, updated_at = self._buckets.get(client, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.per_second)
+
+    def retry_after(self, client: str) -> int:
+        """Seconds until the client has a token again, 0 if it has one now"""
+        with self._lock:
+            missing = 1 - self._tokens(client, time.monotonic())
+        if missing <= 0:
+            return 0
+        return math.ceil(missing / self.per_second) if self.per_second > 0 else 60
+
+    def take(self, client: str) -> int:
+        """Spend a token; returns 0, or the seconds to wait when the bucket is empty"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(client, now)
+            if tokens >= 1:
+                self._buckets[client] = (tokens - 1, now)
+                self._buckets.move_to_end(client)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+                return 0
+        return self.retry_after(client)
+
+
+class _Ticket():
+    def __init__(self, admission, started: float):
+        self._admission = admission
+        self._started = started
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._admission._release(time.monotonic() - self._started)
+
+
+class ChartAdmission():
+    """Admission control in front of the CodeGen chart stage.
+
+    At most `capacity` runs execute (the chart threads) and `queue_max` more
+    wait; past that, new runs are shed and the service goes into degraded
+    mode until the queue has drained to half, so a spike turns into fast
+    stats-only answers instead of a pile of containers. Each client also
+    has a token bucket for new runs. Only requests carrying a client are
+    shed; background jobs always queue, bounded by their own workers.
+    """
+
+    def __init__(self, capacity: int = CHART_WORKERS, queue_max: int = CHART_QUEUE_MAX,
+                 limiter: Optional[RateLimiter] = None):
+        self.capacity = max(capacity, 1)
+        self.queue_max = max(queue_max, 0)
+        self.limiter = limiter or RateLimiter()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._degraded = False
+        self._run_seconds = None
+        self._counters = {"admitted": 0, "shed": 0, "rate_limited": 0, "degraded_periods": 0}
+
+    @property
+    def waiting(self) -> int:
+        return max(0, self._active - self.capacity)
+
+    @property
+    def degraded(self) -> bool:
+        return self._degraded
+
+    def _retry_after(self) -> int:
+        # caller holds self._lock; roughly when a slot frees up for one more run
+        run_seconds = self._run_seconds or DEFAULT_RUN_SECONDS
+        return max(1, math.ceil(run_seconds * (self.waiting + 1) / self.capacity))
+
+    def admit(self, client: Optional[str] = None) -> _Ticket:
+        """A ticket to hold for the whole run (`with admission.admit(client): ...`), or ChartRejected"""
+        with self._lock:
+            if client is not None:
+                if self._degraded or self._active >= self.capacity + self.queue_max:
+                    if not self._degraded:
+                        self._degraded = True
+                        self._counters["degraded_periods"] += 1
+                        print(f"[WARNING] Chart queue full ({self.waiting} waiting), shedding new CodeGen runs")
+                    self._counters["shed"] += 1
+                    metrics.admission_decisions.inc(outcome="shed")
+                    raise ChartRejected("shed", 503, self._retry_after(), client)
+                retry_after = self.limiter.take(client)
+                if retry_after:
+                    self._counters["rate_limited"] += 1
+                    metrics.admission_decisions.inc(outcome="rate_limited")
+                    raise ChartRejected("rate_limited", 429, retry_after, client)
+            self._active += 1
+            self._counters["admitted"] += 1
+        metrics.admission_decisions.inc(outcome="admitted")
+        return _Ticket(self, time.monotonic())
+
+    def _release(self, seconds: float):
+        with self._lock:
+            self._active -= 1
+            self._run_seconds = seconds if self._run_seconds is None else \
+                self._run_seconds + EWMA_ALPHA * (seconds - self._run_seconds)
+            if self._degraded and self.waiting <= self.queue_max // 2:
+                self._degraded = False
+                print("[INFO] Chart queue drained, accepting CodeGen runs again")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                "active": self._active,
+                "waiting": self.waiting,
+                "capacity": self.capacity,
+                "queue_max": self.queue_max,
+                "degraded": self._degraded,
+                "run_seconds": round(self._run_seconds, 2) if self._run_seconds is not None else None,
+            })
+        return stats
+
+
+def client_of(scope) -> Optional[str]:
+    if ADMISSION_TRUST_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+class AdmissionMiddleware():
+    """ASGI middleware recording the client of each request in `current_client`"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_client.set(client_of(scope) or "unknown")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_client.reset(token)
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_chart_admission() -> ChartAdmission:
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = ChartAdmission()
+    return _admission
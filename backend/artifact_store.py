@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHART_STORE_DIR = os.getenv("CHART_STORE_DIR", "./chart_store")
+CHART_STORE_MAX_BYTES = int(os.getenv("CHART_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+
+def stats_digest(player_key: str, summary: dict) -> str:
+    """Content address for a chart: sha256 over the player and the stats it plots"""
+    payload = {"player": player_key, "results": summary.get("results", [])}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def comparison_digest(entries) -> str:
+    """Content address for a comparison chart over (player_key, summary) pairs, in chart order"""
+    payload = {"compare": [{"player": key, "results": summary.get("results", [])} for key, summary in entries]}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST.match(value or ""))
+
+
+class ArtifactStore():
+    """Content-addressed chart files with a total-size bound.
+
+    Files are named by digest, so identical stats map to one artifact. When
+    the store grows past `max_bytes`, the least recently used files (by
+    mtime, refreshed on every read) are deleted.
+    """
+
+    def __init__(self, root=CHART_STORE_DIR, max_bytes=CHART_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0}
+        os.makedirs(root, exist_ok=True)
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(root) if entry.is_file() and not entry.name.startswith(".")
+        )
+
+    def path_for(self, digest: str, ext: str = "png") -> str:
+        return os.path.join(self.root, f"{digest}.{ext}")
+
+    def get(self, digest: str, ext: str = "png"):
+        """Path of a stored artifact, or None. Reading counts as a use for eviction"""
+        path = self.path_for(digest, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        with self._lock:
+            self._counters["hits"] += 1
+        return path
+
+    def put(self, digest: str, src_path: str, ext: str = "png") -> str:
+        """Move a finished file into the store under its digest"""
+        path = self.path_for(digest, ext)
+        # Stage next to the destination so the final rename is atomic
+        fd, tmp_path = tempfile.mkstemp(prefix=".incoming_", dir=self.root)
+        os.close(fd)
+        try:
+            with open(src_path, "rb") as src, open(tmp_path, "wb") as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                previous = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                self._total_bytes += size - previous
+                self._counters["stored"] += 1
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict()
+        return path
+
+    def _evict(self):
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            entries = sorted(
+                (entry for entry in os.scandir(self.root) if entry.is_file() and not entry.name.startswith(".")),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for entry in entries:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                self._total_bytes -= size
+                self._counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["total_bytes"] = self._total_bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
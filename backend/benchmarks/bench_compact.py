@@ -0,0 +1,54 @@
+"""Micro-benchmarks for compact_search_results and _format_cricket_stats.
+
+Runs both over the recorded Tavily contexts in fixtures/ (one per page
+shape: header tables, positional rows, prose, multi-source, bowling-only,
+no stats, a large profile page) and reports the best time per call and
+throughput for each shape.
+
+    python backend/benchmarks/bench_compact.py [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TAVILY_API_KEY", "bench")
+
+from direct_search import direct_web_search  # noqa: E402
+from fakes import load_fixtures  # noqa: E402
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'shape':<26} {'KB':>7} {'formats':>8} {'compact us':>11} {'parse us':>10} {'parse MB/s':>11}")
+    for fixture in load_fixtures():
+        search = direct_web_search(fixture["player"])
+        context = fixture["context"]
+        sources = search._decode_search_context(context)
+        content, url = sources[0]["content"], sources[0]["url"]
+
+        compact_s = best_of(lambda: search.compact_search_results(context), args.repeat)
+        parse_s = best_of(lambda: search._format_cricket_stats(content, url=url), args.repeat)
+        formats = len(search._format_cricket_stats(content, url=url).formats)
+        kb = len(content.encode("utf-8")) / 1024
+        print(f"{fixture['shape']:<26} {kb:>7.1f} {formats:>8} {compact_s * 1e6:>11.1f} "
+              f"{parse_s * 1e6:>10.1f} {kb / 1024 / parse_s:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Offline end-to-end benchmark for /get_stats.
+
+Starts the API in-process with recorded Tavily contexts, a local
+OpenAI-compatible stub and a fake executor pool (see fakes.py), drives
+/get_stats?timings=true at the given concurrency and reports throughput
+plus p50/p95/p99 latency end to end and for every pipeline stage.
+
+    python backend/benchmarks/bench_e2e.py --requests 200 --concurrency 16
+    python backend/benchmarks/bench_e2e.py --renderer codegen --llm-latency 800 --unique
+    python backend/benchmarks/bench_e2e.py --renderer codegen --unique --llm-latency 300,900 --llm-jitter 200 --hedge
+
+--llm-latency takes one latency per stub LLM backend; with several, CodeGen
+calls go through the LLM router across all of them.
+
+All state (caches, chart store, job db) lives in a temp dir, so runs start
+cold unless --warm is given. Latencies are in milliseconds.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _configure_env(args, state_dir):
+    """Point every on-disk cache at the temp dir before the backend reads its config"""
+    os.environ.update({
+        "TAVILY_API_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "SEARCH_CACHE_PATH": os.path.join(state_dir, "search_cache.sqlite3"),
+        "STATS_STORE_PATH": os.path.join(state_dir, "player_stats.sqlite3"),
+        "NAME_ALIAS_PATH": os.path.join(state_dir, "player_aliases.sqlite3"),
+        "CHART_STORE_DIR": os.path.join(state_dir, "chart_store"),
+        "PROGRAM_CACHE_DIR": os.path.join(state_dir, "program_cache"),
+        "PROGRAM_CACHE_ENABLED": "false" if args.no_program_cache else "true",
+        "JOB_DB_PATH": os.path.join(state_dir, "jobs.sqlite3"),
+        "EXECUTOR_POOL_DIR": os.path.join(state_dir, "pool"),
+        "NATIVE_RENDER_ENABLED": "true" if args.renderer == "native" else "false",
+        "LLM_ROUTER_BACKENDS": ",".join(_llm_backend_names(args)),
+        "LLM_HEDGE_ENABLED": "true" if args.hedge else "false",
+        # Every stub is local, but none of them queues like LM Studio does
+        "LLM_LOCAL_PARALLELISM": str(args.concurrency),
+        # Every request comes from 127.0.0.1; the per-client CodeGen budget would cap the whole run
+        "CLIENT_CHART_RATE": "1000000",
+        "CLIENT_CHART_BURST": "1000000",
+    })
+
+
+def _llm_latencies(args):
+    return [float(ms) / 1000 for ms in str(args.llm_latency).split(",")]
+
+
+def _llm_backend_names(args):
+    return ["openai_code_config"] + [f"bench_llm_{i}" for i in range(1, len(_llm_latencies(args)))]
+
+
+def _start_app(args):
+    import uvicorn
+    import coding_gen_test
+    import direct_search
+    import executor_pool
+    import main as app_main
+    from fakes import RecordedTavily, StubLLMServer, load_fixtures, make_fake_executor_pool
+
+    fixtures = load_fixtures()
+    tavily = direct_search.tavily = RecordedTavily(fixtures, latency=args.tavily_latency / 1000)
+    llms = []
+    for name, latency in zip(_llm_backend_names(args), _llm_latencies(args)):
+        llm = StubLLMServer(latency=latency, jitter=args.llm_jitter / 1000).start()
+        coding_gen_test.llm_config_dict[name] = {"model": f"stub-{name}", "base_url": llm.base_url, "api_key": "bench"}
+        llms.append(llm)
+    executor_pool._pool = make_fake_executor_pool(latency=args.sandbox_latency / 1000)
+
+    server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, llms, tavily
+
+
+def _player_names(args, fixtures):
+    players = [fixture["player"] for fixture in fixtures]
+    if args.unique:
+        # Distinct names miss every cache, but still map to a recorded page
+        return [f"{players[i % len(players)]} {i}" for i in range(args.requests)]
+    return [players[i % len(players)] for i in range(args.requests)]
+
+
+def _router_stats():
+    import coding_gen_test
+    from llm_router import get_llm_router
+
+    return get_llm_router(coding_gen_test.llm_config_dict).stats()
+
+
+def run(args, fixtures):
+    import requests
+
+    base = f"http://127.0.0.1:{args.port}"
+    names = _player_names(args, fixtures)
+    local = threading.local()
+
+    def one(name):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.get(f"{base}/get_stats", params={
+            "player_name": name, "refresh": str(args.refresh).lower(),
+            "chart": str(not args.no_chart).lower(), "timings": "true",
+            # Unique names are deliberately near-duplicates; don't let name resolution merge them
+            "exact": str(args.unique).lower()})
+        elapsed = (time.perf_counter() - started) * 1000
+        body = response.json() if response.status_code == 200 else {}
+        return {"status": response.status_code, "ms": elapsed, "timings": body.get("timings", {}),
+                "chart": body.get("chart_generated"), "renderer": body.get("chart_renderer")}
+
+    if args.warm:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(one, sorted(set(names))))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, names))
+    wall = time.perf_counter() - started
+    return results, wall
+
+
+def report(args, results, wall, llms, router, tavily, out=sys.stdout):
+    stages = {}
+    for result in results:
+        for span in result["timings"].get("spans", []):
+            stages.setdefault(span["name"], []).append(span["ms"])
+    # A request that asked for a chart and got none failed too; counted apart, a broken chart
+    # stage would otherwise read as a speedup
+    chart_errors = 0 if args.no_chart else \
+        sum(r["status"] == 200 and (not r["chart"] or r["renderer"] is None) for r in results)
+    errors = sum(r["status"] != 200 for r in results) + chart_errors
+    renderers = {}
+    for result in results:
+        renderers[result["renderer"]] = renderers.get(result["renderer"], 0) + 1
+
+    latencies = [r["ms"] for r in results]
+    summary = {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "chart_errors": chart_errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+        "renderers": renderers,
+        "llm_calls": sum(llm.calls for llm in llms),
+        "llm_connections": sum(llm.connections for llm in llms),
+        "llm_router": router,
+        "tavily_calls": tavily.calls,
+        "stages": {"end_to_end": latencies, **stages},
+    }
+
+    print(f"requests={summary['requests']} concurrency={args.concurrency} errors={errors} "
+          f"(chart_errors={chart_errors}) wall={summary['wall_s']}s throughput={summary['throughput_rps']} req/s", file=out)
+    print(f"renderers={renderers} llm_calls={summary['llm_calls']} llm_connections={summary['llm_connections']} "
+          f"tavily_calls={summary['tavily_calls']}", file=out)
+    if len(llms) > 1 or args.hedge:
+        print(f"llm_router failovers={router['failovers']} hedges={router['hedges']} "
+              f"hedge_wins={router['hedge_wins']}", file=out)
+        for name, backend in router["backends"].items():
+            print(f"  {name:<22} requests={backend['requests']} errors={backend['errors']} "
+                  f"p50={backend['p50_ms'] or '-'}ms p95={backend['p95_ms'] or '-'}ms", file=out)
+    print(f"{'stage':<26} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}", file=out)
+    for name, values in summary["stages"].items():
+        print(f"{name:<26} {len(values):>6} {percentile(values, 50):>10.2f} "
+              f"{percentile(values, 95):>10.2f} {percentile(values, 99):>10.2f}", file=out)
+
+    if args.json:
+        summary["stages"] = {name: {"count": len(values), "p50": percentile(values, 50),
+                                    "p95": percentile(values, 95), "p99": percentile(values, 99)}
+                             for name, values in summary["stages"].items()}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tavily-latency", type=float, default=300.0)
+    parser.add_argument("--llm-latency", default="500", help="ms per call; comma-separated for several backends")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="mean extra ms per LLM call (exponential tail)")
+    parser.add_argument("--hedge", action="store_true", help="hedge slow LLM calls to the next backend")
+    parser.add_argument("--sandbox-latency", type=float, default=200.0)
+    parser.add_argument("--renderer", choices=("native", "codegen"), default="native",
+                        help="codegen disables the native renderer so every chart goes through the LLM")
+    parser.add_argument("--unique", action="store_true", help="a distinct player name per request")
+    parser.add_argument("--refresh", action="store_true", help="bypass the search cache")
+    parser.add_argument("--no-chart", action="store_true")
+    parser.add_argument("--no-program-cache", action="store_true")
+    parser.add_argument("--warm", action="store_true", help="request every player once before timing")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--json", help="also write the summary to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the backend's logs and chat transcripts")
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix="cricket_bench_")
+    _configure_env(args, state_dir)
+    # The backend keeps relative paths (docker_tmp) under the working directory
+    os.chdir(state_dir)
+
+    out = sys.stdout
+    if not args.verbose:
+        # The backend and autogen print every step; keep only the report
+        sys.stdout = open(os.devnull, "w")
+    server, thread, llms, tavily = _start_app(args)
+    try:
+        results, wall = run(args, tavily.fixtures)
+        router = _router_stats()
+        errors = report(args, results, wall, llms, router, tavily, out=out)
+    finally:
+        server.should_exit = True
+        thread.join()
+        for llm in llms:
+            llm.stop()
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Micro-benchmark for stats_parser.parse_career_stats over large scraped pages.
+
+Builds synthetic pages of increasing size that mix prose, unrelated tables,
+bowling tables and "near miss" lines full of format names and numbers (the
+input that made the old unanchored regexes backtrack), then reports parse
+time per KB. Parse time should grow linearly with input size.
+
+    python backend/benchmarks/bench_parser.py [--max-kb 4096] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_parser import parse_career_stats  # noqa: E402
+
+STATS_TABLE = """| Format | Mat | Inns | Runs | HS | Ave | 100s | 50s |
+|---|---|---|---|---|---|---|---|
+| Test | 113 | 191 | 8,848 | 254* | 49.15 | 29 | 30 |
+| ODI | 292 | 280 | 13,848 | 183 | 58.18 | 50 | 72 |
+| T20I | 125 | 117 | 4,188 | 122* | 48.69 | 1 | 38 |
+"""
+
+PROSE = [
+    "He made his debut against Sri Lanka and went on to captain the side in all formats.",
+    "The Test series was drawn after rain washed out the final day at the ground.",
+    "In ODI cricket he is regarded as one of the finest chasers of the modern era.",
+    "Statistics are correct as of the end of the most recent international series.",
+]
+
+
+def _near_miss(rng: random.Random) -> str:
+    numbers = " ".join(str(rng.randint(0, 99999)) for _ in range(rng.randint(20, 60)))
+    return f"Test ODI T20I {numbers} Test {numbers}"
+
+
+def build_page(size_kb: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target = size_kb * 1024
+    parts, size = [], 0
+    while size < target:
+        roll = rng.random()
+        if roll < 0.6:
+            chunk = rng.choice(PROSE)
+        elif roll < 0.85:
+            chunk = _near_miss(rng)
+        else:
+            chunk = "| Season | Team | Mat | Runs |\n| 2019 | RCB | 14 | 464 |\n| 2020 | RCB | 15 | 466 |"
+        parts.append(chunk)
+        size += len(chunk) + 1
+    # The real table sits at the end, so the whole page has to be scanned
+    parts.append(STATS_TABLE)
+    return "\n".join(parts)
+
+
+def time_parse(page: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = parse_career_stats(page, url="https://bench")
+        best = min(best, time.perf_counter() - started)
+    assert set(result.to_dict()) == {"Test", "ODI", "T20I"}, "benchmark page did not parse"
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-kb", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = []
+    size = 16
+    while size <= args.max_kb:
+        sizes.append(size)
+        size *= 4
+
+    print(f"{'size':>10} {'best ms':>10} {'us/KB':>8} {'MB/s':>8}")
+    per_kb = []
+    for size_kb in sizes:
+        page = build_page(size_kb)
+        seconds = time_parse(page, args.repeat)
+        kb = len(page) / 1024
+        per_kb.append(seconds * 1e6 / kb)
+        print(f"{size_kb:>8}KB {seconds * 1000:>10.2f} {per_kb[-1]:>8.2f} {kb / 1024 / seconds:>8.1f}")
+
+    growth = per_kb[-1] / per_kb[0]
+    print(f"per-KB cost, largest vs smallest page: {growth:.2f}x (1.0x = perfectly linear)")
+    # Allow for cache effects on big pages; super-linear parsing blows well past this
+    if growth > 3.0:
+        print("FAIL: parse time is growing faster than input size")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
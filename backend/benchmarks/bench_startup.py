@@ -0,0 +1,117 @@
+"""Cold-start benchmark for the API.
+
+Starts the backend in fresh interpreters and times, per run: importing
+main, app startup (lifespan) until the server accepts requests, and the
+first /get_stats request, plus the wall time from spawning the process to
+that first response. Tavily is replaced by recorded contexts (see fakes.py)
+so only our own startup is measured. Also reports which heavy modules the
+process had to load; search-only traffic should need none of them.
+
+    python backend/benchmarks/bench_startup.py [--runs 5] [--chart]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("autogen", "docker", "openai", "httpx", "tavily", "matplotlib", "pandas")
+
+
+def child(args):
+    """One cold start, timed from inside the process; prints a JSON line"""
+    started = time.perf_counter()
+    state_dir = tempfile.mkdtemp(prefix="cricket_startup_")
+    os.environ.update({
+        "TAVILY_API_KEY": "bench",
+        "SEARCH_CACHE_PATH": os.path.join(state_dir, "search_cache.sqlite3"),
+        "STATS_STORE_PATH": os.path.join(state_dir, "player_stats.sqlite3"),
+        "NAME_ALIAS_PATH": os.path.join(state_dir, "player_aliases.sqlite3"),
+        "CHART_STORE_DIR": os.path.join(state_dir, "chart_store"),
+        "PROGRAM_CACHE_DIR": os.path.join(state_dir, "program_cache"),
+        "JOB_DB_PATH": os.path.join(state_dir, "jobs.sqlite3"),
+        "EXECUTOR_POOL_DIR": os.path.join(state_dir, "pool"),
+    })
+    os.chdir(state_dir)
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # Startup logs would interleave with the result line
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+
+    import main as app_main
+    imported = time.perf_counter()
+
+    import threading
+    import urllib.parse
+    import urllib.request
+
+    import direct_search
+    import uvicorn
+    from fakes import RecordedTavily, load_fixtures
+
+    direct_search.tavily = RecordedTavily(load_fixtures())
+    server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.001)
+    ready = time.perf_counter()
+
+    query = urllib.parse.urlencode({"player_name": "Virat Kohli", "chart": str(args.chart).lower()})
+    with urllib.request.urlopen(f"http://127.0.0.1:{args.port}/get_stats?{query}", timeout=120) as response:
+        status = response.status
+        response.read()
+    first = time.perf_counter()
+    first_wall = time.time()
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    server.should_exit = True
+    thread.join()
+    sys.stdout = stdout
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_request_ms": (first - ready) * 1000,
+        "first_response_at": first_wall,
+        "status": status,
+        "heavy_modules": loaded,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--chart", action="store_true", help="ask for a chart in the first request")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        spawned = time.time()
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--port", str(args.port)]
+        if args.chart:
+            command.append("--chart")
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run["spawn_to_first_response_ms"] = (run.pop("first_response_at") - spawned) * 1000
+        runs.append(run)
+
+    print(f"runs={len(runs)} chart={args.chart} statuses={sorted({r['status'] for r in runs})}")
+    print(f"{'phase':<28} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for phase in ("import_ms", "startup_ms", "first_request_ms", "spawn_to_first_response_ms"):
+        values = [r[phase] for r in runs]
+        print(f"{phase[:-3]:<28} {statistics.median(values):>10.1f} {min(values):>10.1f} {max(values):>10.1f}")
+    print(f"heavy modules loaded: {', '.join(runs[-1]['heavy_modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Local stand-ins for Tavily, the OpenAI-compatible LLM and the Docker sandbox.
+
+Used by bench_e2e.py so the whole /get_stats pipeline can be driven offline,
+with configurable latency in place of each external call. Import this only
+after the backend modules are importable (backend/ on sys.path).
+"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "tavily_contexts.json")
+
+
+def load_fixtures(path=FIXTURES_PATH) -> list:
+    """Recorded get_search_context outputs: [{"player", "shape", "context"}]"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RecordedTavily():
+    """Drop-in for the TavilyClient used by direct_search, replaying recorded contexts"""
+
+    def __init__(self, fixtures, latency=0.0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_search_context(self, query, **kwargs):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.latency)
+        lowered = query.lower()
+        for fixture in self.fixtures:
+            if fixture["player"].lower() in lowered:
+                return fixture["context"]
+        # Unknown players get the recorded pages in turn
+        return self.fixtures[calls % len(self.fixtures)]["context"]
+
+
+# Smallest valid PNG (1x1, transparent); the stub program writes it as the chart
+_PNG_HEX = ("89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+            "0000000d49444154789c6360000002000100e221bc330000000049454e44ae426082")
+
+STUB_PROGRAM = f"""```python
+import json
+import os
+import random
+
+with open('stats_data.json') as f:
+    data = json.load(f)
+print('Loaded stats for', data.get('player_name'))
+with open(os.path.abspath('cricket_stats_chart.png'), 'wb') as f:
+    f.write(bytes.fromhex('{_PNG_HEX}'))
+print('Chart saved')
+```"""
+
+
+class StubLLMServer():
+    """OpenAI-compatible /v1/chat/completions server with a fixed latency per call.
+
+    The first turn of a chat gets STUB_PROGRAM; once the conversation
+    contains an execution result the reply is TERMINATE, like a real model
+    wrapping up after a clean run. `jitter` adds an exponentially
+    distributed delay (mean `jitter` seconds) for a long latency tail.
+    Connections are kept alive; `connections` counts how many were opened.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out as separate writes; don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                payload = json.dumps(stub.complete(body)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def complete(self, body: dict) -> dict:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency + (random.expovariate(1 / self.jitter) if self.jitter else 0.0))
+        messages = body.get("messages", [])
+        executed = any("exitcode" in str(m.get("content", "")) for m in messages)
+        content = "TERMINATE" if executed else STUB_PROGRAM
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-bench-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeCodeExecutor():
+    """Runs python blocks with the local interpreter after a fixed sandbox overhead"""
+
+    status = "running"
+
+    def __init__(self, work_dir, latency=0.0, timeout=60):
+        self.work_dir = work_dir
+        self.latency = latency
+        self.timeout = timeout
+        self._container = self  # PooledSandbox.healthy() reloads the container
+
+    def reload(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def execute_code_blocks(self, code_blocks):
+        from autogen.coding.local_commandline_code_executor import CommandlineCodeResult
+
+        time.sleep(self.latency)
+        outputs = []
+        for block in code_blocks:
+            if block.language.lower() not in ("python", "py"):
+                continue
+            fd, path = tempfile.mkstemp(suffix=".py", dir=self.work_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(block.code)
+            try:
+                proc = subprocess.run([sys.executable, path], cwd=self.work_dir, capture_output=True,
+                                      text=True, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                return CommandlineCodeResult(exit_code=124, output="Timeout")
+            finally:
+                os.remove(path)
+            outputs.append(proc.stdout + proc.stderr)
+            if proc.returncode != 0:
+                return CommandlineCodeResult(exit_code=proc.returncode, output="".join(outputs))
+        return CommandlineCodeResult(exit_code=0, output="".join(outputs))
+
+
+def make_fake_executor_pool(latency=0.0, **pool_kwargs):
+    """An ExecutorPool whose slots are FakeCodeExecutors instead of containers"""
+    from executor_pool import ExecutorPool, PooledSandbox
+
+    class FakeExecutorPool(ExecutorPool):
+        def _ensure_image(self):
+            pass
+
+        def _create(self):
+            os.makedirs(self.root_dir, exist_ok=True)
+            work_dir = tempfile.mkdtemp(prefix="slot_", dir=self.root_dir)
+            with self._cond:
+                self._counters["created"] += 1
+            return PooledSandbox(FakeCodeExecutor(work_dir, latency), work_dir)
+
+    return FakeExecutorPool(image="bench-fake", **pool_kwargs)
@@ -0,0 +1,228 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+NATIVE_RENDER_ENABLED = os.getenv("NATIVE_RENDER_ENABLED", "true").lower() in ("1", "true", "yes")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+
+FORMATS = ("Test", "ODI", "T20I")
+METRICS = (
+    ("matches", "Matches Played"),
+    ("runs", "Runs Scored"),
+    ("avg", "Batting Average"),
+    ("centuries", "Centuries"),
+)
+FORMAT_COLORS = ("#1f77b4", "#ff7f0e", "#2ca02c")
+
+# ?variant= of /charts -> (file format, max width in px or None for full size)
+CHART_VARIANTS = {
+    "thumb": ("webp", 320),
+    "medium": ("webp", 800),
+    "webp": ("webp", None),
+    "png": ("png", None),
+    "svg": ("svg", None),
+}
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+CHART_WEBP_QUALITY = int(os.getenv("CHART_WEBP_QUALITY", "80"))
+
+def parse_career_stats(summary) -> Optional[dict]:
+    """Per-format stats from a compact search summary's typed record, or None if nothing parsed"""
+    try:
+        typed = summary["results"][0]["stats"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    if not isinstance(typed, dict):
+        return None
+
+    stats = {}
+    for fmt in FORMATS:
+        record = typed.get(fmt)
+        if not record:
+            continue
+        stats[fmt] = {metric: record.get(metric) or 0 for metric, _ in METRICS}
+    return stats or None
+
+
+def _init_worker():
+    # Pay for the matplotlib import once per worker, not once per chart
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+
+
+def render_chart(stats: dict, player_name: str, output_path: str) -> str:
+    """Draw the 2x2 matches/runs/average/centuries bar grid and save it as a PNG"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(12, 9))
+    for ax, (metric, title) in zip(axes.flat, METRICS):
+        values = [stats.get(fmt, {}).get(metric, 0) for fmt in FORMATS]
+        bars = ax.bar(FORMATS, values, color=FORMAT_COLORS)
+        ax.set_title(title, fontsize=13, fontweight="bold")
+        ax.set_ylabel(title)
+        ax.grid(axis="y", alpha=0.3)
+        top = max(values) if max(values) > 0 else 1
+        ax.set_ylim(0, top * 1.15)
+        for bar, value in zip(bars, values):
+            label = f"{value:.2f}" if metric == "avg" else f"{int(value)}"
+            ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + top * 0.01,
+                    label, ha="center", va="bottom", fontsize=11)
+
+    fig.suptitle(f"Cricket Career Statistics - {player_name}", fontsize=16, fontweight="bold")
+    fig.tight_layout(rect=(0, 0, 1, 0.96))
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    fig.savefig(output_path, dpi=100)
+    plt.close(fig)
+    return output_path
+
+
+def render_comparison_chart(player_names: list, panels: list, output_path: str) -> str:
+    """Draw one 2x2 figure of grouped bars (formats on the x axis, one bar per player) and save it as a PNG.
+
+    `panels` is [(title, values)] with values as players x FORMATS; NaN
+    (no data) bars are left out.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    count = len(player_names)
+    colors = plt.get_cmap("tab20" if count > 10 else "tab10")
+    width = 0.8 / count
+    positions = np.arange(len(FORMATS))
+    fig, axes = plt.subplots(2, 2, figsize=(max(12, 6 + count * 0.9), 10))
+    for ax, (title, values) in zip(axes.flat, panels):
+        values = np.array(values, dtype=float)
+        for p, name in enumerate(player_names):
+            offsets = positions - 0.4 + width * (p + 0.5)
+            bars = ax.bar(offsets, values[p], width, label=name, color=colors(p % colors.N))
+            if count <= 6:
+                for bar, value in zip(bars, values[p]):
+                    if not np.isnan(value):
+                        label = f"{value:.2f}" if not float(value).is_integer() else f"{int(value)}"
+                        ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height(), label,
+                                ha="center", va="bottom", fontsize=8)
+        ax.set_title(title, fontsize=13, fontweight="bold")
+        ax.set_xticks(positions)
+        ax.set_xticklabels(FORMATS)
+        ax.grid(axis="y", alpha=0.3)
+        top = np.nanmax(values) if not np.isnan(values).all() else 1
+        ax.set_ylim(0, (top or 1) * 1.15)
+
+    handles, labels = axes.flat[0].get_legend_handles_labels()
+    fig.legend(handles, labels, loc="lower center", ncol=min(count, 5), fontsize=10)
+    fig.suptitle(f"Cricket Career Comparison - {count} players", fontsize=16, fontweight="bold")
+    legend_rows = math.ceil(count / 5)
+    fig.tight_layout(rect=(0, 0.04 * legend_rows, 1, 0.96))
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    fig.savefig(output_path, dpi=100)
+    plt.close(fig)
+    return output_path
+
+
+def render_variant(src_path: str, variant: str, output_path: str) -> str:
+    """Write a raster variant (resized WebP, optimized PNG) of a stored chart PNG"""
+    from PIL import Image
+
+    fmt, max_width = CHART_VARIANTS[variant]
+    with Image.open(src_path) as image:
+        image = image.convert("RGB")
+        if max_width and image.width > max_width:
+            image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+        if fmt == "webp":
+            image.save(output_path, "WEBP", quality=CHART_WEBP_QUALITY, method=6)
+        else:
+            # Bar charts use a handful of colors; a palette keeps them exact at a fraction of the size
+            image.quantize(colors=256, method=Image.Quantize.MEDIANCUT).save(output_path, "PNG", optimize=True)
+    return output_path
+
+
+def render_svg(spec: dict, output_path: str) -> str:
+    """Re-draw a natively rendered chart as SVG from the spec stored with it.
+
+    `spec` is {"kind": "player", "stats", "player_name"} or
+    {"kind": "comparison", "player_names", "panels"}: the render inputs.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    # Keep text as text: a fraction of the size of outlined glyphs, and still selectable
+    matplotlib.rcParams["svg.fonttype"] = "none"
+
+    if spec.get("kind") == "comparison":
+        return render_comparison_chart(spec["player_names"], spec["panels"], output_path)
+    return render_chart(spec["stats"], spec["player_name"], output_path)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the server process is multi-threaded
+                _pool = ProcessPoolExecutor(
+                    max_workers=RENDER_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+    return _pool
+
+
+def _noop():
+    return None
+
+
+def warm_up():
+    """Start the render workers ahead of the first request"""
+    pool = _get_pool()
+    for _ in range(RENDER_WORKERS):
+        pool.submit(_noop)
+
+
+async def render_chart_async(stats: dict, player_name: str, output_path: str) -> str:
+    """Render in the worker process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # Workers may not share our working directory
+    output_path = os.path.abspath(output_path)
+    return await loop.run_in_executor(_get_pool(), render_chart, stats, player_name, output_path)
+
+
+async def render_comparison_chart_async(player_names: list, panels: list, output_path: str) -> str:
+    loop = asyncio.get_running_loop()
+    output_path = os.path.abspath(output_path)
+    return await loop.run_in_executor(_get_pool(), render_comparison_chart, player_names, panels, output_path)
+
+
+async def render_variant_async(src_path: str, variant: str, output_path: str) -> str:
+    loop = asyncio.get_running_loop()
+    output_path = os.path.abspath(output_path)
+    if variant == "svg":
+        raise ValueError("SVG is drawn from the render spec, use render_svg_async")
+    return await loop.run_in_executor(_get_pool(), render_variant, src_path, variant, output_path)
+
+
+async def render_svg_async(spec: dict, output_path: str) -> str:
+    loop = asyncio.get_running_loop()
+    output_path = os.path.abspath(output_path)
+    return await loop.run_in_executor(_get_pool(), render_svg, spec, output_path)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
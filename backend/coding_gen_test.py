@@ -1,18 +1,19 @@
-from autogen import AssistantAgent, ConversableAgent, UserProxyAgent
-from autogen.coding import DockerCommandLineCodeExecutor
 import os
-import shutil
 from dotenv import load_dotenv
 import json
+import metrics
+from stages import llm_slots
+from executor_pool import get_executor_pool, run_in_sandbox
+from program_cache import DATA_FILENAME, PROGRAM_CACHE_ENABLED, get_program_cache
+from prompt_builder import build_codegen_prompt, prompt_budget
+from llm_router import get_llm_router
 
 # Simple Unicode fix
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 
+# Created by the app's lifespan; runs use their own subdirectories, so never wipe this
+# (other workers may be using it)
 shared_dir = "./docker_tmp"
-# Remove existing directory and recreate it fresh
-if os.path.exists(shared_dir):
-    shutil.rmtree(shared_dir)
-os.makedirs(shared_dir)
 
 load_dotenv()
 
@@ -31,20 +32,129 @@ llm_config_dict = {"fast_reasioning" : {
                           "api_key": os.getenv("OPENAI_API_KEY")}
         }
 
+class PooledSandboxExecutor():
+    """Code executor that runs each batch of code blocks on a warm container from the pool.
+
+    The pool's max size bounds how many sandboxes execute at once. Implements
+    autogen's CodeExecutor protocol in full (user_capability included), which
+    the pinned autogen checks with isinstance before accepting an executor.
+    """
+    class UserCapability():
+        """The CodeGen prompts already tell the agents how to write code; nothing to add"""
+        def add_to_agent(self, agent):
+            pass
+
+    def __init__(self, work_dir, on_event=None):
+        self.work_dir = work_dir
+        self.on_event = on_event
+        # Python blocks of the last batch that ran cleanly, kept for the program cache
+        self.last_success = None
+
+    @property
+    def user_capability(self):
+        return PooledSandboxExecutor.UserCapability()
+
+    @property
+    def code_extractor(self):
+        from autogen.coding import MarkdownCodeExtractor
+
+        return MarkdownCodeExtractor()
+
+    def execute_code_blocks(self, code_blocks):
+        if self.on_event:
+            self.on_event("sandbox_running", blocks=len(code_blocks))
+        result = run_in_sandbox(get_executor_pool(), code_blocks, self.work_dir)
+        if self.on_event:
+            self.on_event("sandbox_finished", exit_code=result.exit_code)
+        python_blocks = [{"language": "python", "code": block.code} for block in code_blocks
+                         if block.language.lower() in ("python", "py")]
+        if result.exit_code == 0 and python_blocks:
+            self.last_success = python_blocks
+        return result
+
+    def restart(self):
+        # Containers are recycled by the pool, nothing to restart per chat
+        pass
+
+
+def _routed_reply(recipient, messages, primary=None, fits=None):
+    """The assistant's next reply from the LLM router, generated while holding an LLM slot"""
+    all_messages = [{"role": "system", "content": recipient.system_message}] + list(messages or [])
+    with metrics.span("llm_slot_wait"):
+        llm_slots.acquire()
+    try:
+        with metrics.span("llm_turn"):
+            reply = get_llm_router(llm_config_dict).complete(all_messages, primary=primary, fits=fits)
+    finally:
+        llm_slots.release()
+    metrics.count_bytes("llm", "out", len(json.dumps(all_messages, default=str).encode("utf-8")))
+    metrics.count_bytes("llm", "in", len(reply.content.encode("utf-8")))
+    metrics.count_tokens(reply.model, reply.prompt_tokens, reply.completion_tokens)
+    return reply
+
+
 class CodeGen():
-    def __init__(self,summary):
+    def __init__(self,summary,work_dir=shared_dir,on_event=None):
         self.summary = summary
+        # Sandbox blocks run in this dir (the caller's per-run dir), where the chart is written
+        self.work_dir = work_dir
+        # Optional progress callback, on_event(event, **data); called from the chart thread
+        self.on_event = on_event
         
         
 
+    def _replay_cached_program(self, chart_file):
+        """Re-run a cached program for this summary's shape; True if it produced the chart"""
+        cache = get_program_cache()
+        code_blocks = cache.lookup(self.summary)
+        if code_blocks is None:
+            return False
+
+        from autogen.coding import CodeBlock
+
+        try:
+            blocks = [CodeBlock(code=b["code"], language=b["language"]) for b in code_blocks]
+            self._emit("code_generated", source="program_cache")
+            self._emit("sandbox_running", blocks=len(blocks))
+            result = run_in_sandbox(get_executor_pool(), blocks, self.work_dir)
+            replayed = result.exit_code == 0 and os.path.exists(chart_file)
+        except Exception as e:
+            print(f"[WARNING] Cached program replay error: {e}")
+            replayed = False
+
+        if replayed:
+            cache.record_hit(self.summary)
+        else:
+            print("[INFO] Cached program failed on this data, asking the LLM for a new one")
+            cache.record_failure(self.summary)
+            if os.path.exists(chart_file):
+                os.remove(chart_file)
+        return replayed
+
+    def _emit(self, event, **data):
+        if self.on_event:
+            self.on_event(event, **data)
+
     def codeExecutor(self):
-        # Docker executor configuration with proper file handling
-        # Using full python:3.10 image (not slim) for better package support
-        docker_executor = DockerCommandLineCodeExecutor(
-            image="python:3.10",
-            timeout=600,  # Increased timeout for package installation
-            work_dir=shared_dir  # Use local shared directory directly
-        )
+        # autogen takes about a second to import; only CodeGen runs pay for it
+        from autogen import Agent, AssistantAgent, UserProxyAgent
+
+        # Code runs on warm containers from the pre-baked sandbox image (matplotlib installed);
+        # containers of a cold pool start while the program is looked up or written
+        get_executor_pool().warm()
+        os.makedirs(self.work_dir, exist_ok=True)
+        chart_file = os.path.join(self.work_dir, "cricket_stats_chart.png")
+
+        # Generated programs load the stats from this file, so they can be replayed on new data
+        with open(os.path.join(self.work_dir, DATA_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(self.summary, f)
+
+        if PROGRAM_CACHE_ENABLED and self._replay_cached_program(chart_file):
+            print(f"[SUCCESS] Chart generated by cached program: {chart_file}")
+            return
+
+        executor = PooledSandboxExecutor(self.work_dir, on_event=self.on_event)
+        llm_calls = 0
 
         # User proxy agent with code execution capabilities
         user_proxy = UserProxyAgent(
@@ -52,71 +162,50 @@ class CodeGen():
             is_termination_msg=lambda x: x.get('content') is not None and 'TERMINATE' in x['content'],
             human_input_mode='NEVER',
             system_message="You are a helpful user who runs LLM-generated code using Docker.",
-            code_execution_config={"executor": docker_executor}
+            code_execution_config={"executor": executor}
         )
 
+        # The chat starts on the backend expected to answer first; its prompt is sized for that model
+        router = get_llm_router(llm_config_dict)
+        backend = router.choose()
+        model = backend.model if backend else llm_config_dict["openai_code_config"]["model"]
+        prompt = build_codegen_prompt(self.summary, model)
+        metrics.prompt_tokens.observe(prompt.tokens, model=prompt.model)
+        print(f"[INFO] CodeGen prompt: {prompt.tokens} tokens ({prompt.counter}), budget {prompt.budget}, "
+              f"data {prompt.data_tokens} tokens, pruned: {', '.join(prompt.pruned) or 'nothing'}")
+        if prompt.over_budget:
+            print(f"[WARNING] CodeGen prompt is over its {prompt.budget} token budget for {prompt.model}")
+
+        def fits(candidate):
+            # Failover and hedged requests only go to models with room for this prompt
+            return prompt_budget(candidate.model) >= prompt.tokens
+
+        tokens_used = 0
+
+        def counted_llm_reply(recipient, messages=None, sender=None, config=None):
+            nonlocal llm_calls, tokens_used
+            llm_calls += 1
+            reply = _routed_reply(recipient, messages, primary=backend, fits=fits)
+            tokens_used += reply.prompt_tokens + reply.completion_tokens
+            if "```" in reply.content:
+                self._emit("code_generated", source="llm", turn=llm_calls, model=reply.model)
+            # Always final, so the stock LLM reply function is never called
+            return True, reply.content
+
         # Assistant agent for code generation
         assistant = AssistantAgent(
             name='code_writer',
-            llm_config=llm_config_dict['openai_code_config'],
-            system_message="""You are a Python coding assistant. Write code to analyze cricket statistics and create charts.
-
-REQUIRED OUTPUT FORMAT:
-1. First: bash block to install matplotlib
-2. Second: python block with complete solution
-
-IMPORTANT RULES:
-- Use matplotlib.use('Agg') for headless environment
-- Parse the provided JSON data to extract cricket statistics
-- Create 4 charts in 2x2 grid: matches, runs, averages, centuries
-- Add value labels on top of each bar
-- Save chart as absolute path: os.path.abspath('cricket_stats_chart.png')
-
-PARSING STRATEGY:
-- Look for "Career statistics:" in the content
-- Extract numbers for Test, ODI, T20I formats
-- Remove commas from numbers before parsing
-- Handle parsing errors gracefully
-
-CHART REQUIREMENTS:
-- 2x2 subplot layout
-- Bar charts for each metric
-- Text labels showing values on bars
-- Proper titles and formatting
-
-Write clean, working code that solves this problem. Please avoid using emojis or special Unicode characters in your responses."""
+            # Replies come from counted_llm_reply, so the agent needs no client of its own
+            llm_config=False,
+            system_message=prompt.system_message
         )
+        assistant.register_reply([Agent, None], counted_llm_reply)
 
         # Let assistant handle parsing and visualization
         try:
             user_proxy.initiate_chat(
                 recipient=assistant,
-                message=f"""
-        I have cricket statistics data in JSON format that needs to be parsed and visualized.
-
-        Data:
-        {json.dumps(self.summary, indent=2)}
-
-        Your task:
-        1. Parse this JSON data and extract cricket statistics (matches, runs, averages, centuries)
-        2. Handle the text parsing from the 'content' fields in the results array
-        3. Create a professional bar chart visualization showing the stats across Test, ODI, and T20I formats  
-        4. Save the chart as 'cricket_stats_chart.png' in the current directory
-
-        Requirements:
-        - Install matplotlib with: pip install matplotlib
-        - Set matplotlib backend for headless Docker: import matplotlib; matplotlib.use('Agg')
-        - Extract numeric data from the text content (handle commas in numbers like "14,181")
-        - Create a multi-panel chart (2x2 grid) showing: matches, runs, averages, centuries
-        - Add proper labels, titles, and formatting
-        - **ADD VALUE LABELS: Place exact numbers on top of each bar using ax.text() method**
-        - Save as PNG file with absolute path to ensure Docker file persistence
-        - Use print statements to show progress
-
-        The PNG file should be saved and accessible from the host system after execution.
-
-        TERMINATE when complete.
-        """,
+                message=prompt.message,
                 max_turns=2
             )
         except UnicodeEncodeError as e:
@@ -124,16 +213,22 @@ Write clean, working code that solves this problem. Please avoid using emojis or
         except Exception as e:
             print(f"[ERROR] Chat execution error: {e}")
             
+        get_program_cache().record_generation(llm_calls)
+
         # Always check if the chart was generated
-        chart_file = os.path.join(shared_dir, "cricket_stats_chart.png")
         if os.path.exists(chart_file):
             print(f"[SUCCESS] Chart found after execution: {chart_file}")
+            if PROGRAM_CACHE_ENABLED and executor.last_success:
+                stored = get_program_cache().store(self.summary, executor.last_success,
+                                                   llm_calls=llm_calls, tokens=tokens_used)
+                if stored:
+                    print("[INFO] Cached the generated program for replay")
         else:
             print(f"[WARNING] Chart not found at expected location: {chart_file}")
             # List what files were actually created
-            if os.path.exists(shared_dir):
-                files = os.listdir(shared_dir)
-                print(f"[DEBUG] Files in {shared_dir}: {files}")
+            if os.path.exists(self.work_dir):
+                files = os.listdir(self.work_dir)
+                print(f"[DEBUG] Files in {self.work_dir}: {files}")
 
 
 
@@ -0,0 +1,135 @@
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from stats_parser import FORMATS
+from stats_store import typed_stats
+
+METRICS = ("matches", "innings", "runs", "avg", "centuries")
+DERIVED = ("runs_per_match", "centuries_per_innings")
+# Panels of the comparison chart: (title, feature)
+CHART_PANELS = (
+    ("Runs Scored", "runs"),
+    ("Batting Average", "avg"),
+    ("Runs per Match", "runs_per_match"),
+    ("Centuries per Innings", "centuries_per_innings"),
+)
+
+
+@dataclass
+class StatsMatrix:
+    """Parsed stats of several players as one float array, NaN where a value is missing"""
+    player_keys: List[str]
+    player_names: List[str]
+    values: np.ndarray  # players x FORMATS x METRICS
+
+    def metric(self, name: str) -> np.ndarray:
+        return self.values[..., METRICS.index(name)]
+
+
+@dataclass
+class Comparison:
+    matrix: StatsMatrix
+    features: Tuple[str, ...]  # METRICS + DERIVED
+    values: np.ndarray  # players x FORMATS x features
+    ranks: np.ndarray  # same shape; 1.0 best .. 0.0 worst among players with a value, NaN without
+    overall: np.ndarray  # players; mean normalized rank over every format and feature
+
+    def ranking(self) -> List[int]:
+        """Player indexes, best overall first; players with no values last"""
+        scores = np.where(np.isnan(self.overall), -np.inf, self.overall)
+        return list(np.argsort(-scores, kind="stable"))
+
+    def feature(self, name: str) -> np.ndarray:
+        return self.values[..., self.features.index(name)]
+
+
+def build_matrix(entries: List[Tuple[str, str, dict]]) -> StatsMatrix:
+    """Matrix from (player_key, player_name, compact summary) triples"""
+    values = np.full((len(entries), len(FORMATS), len(METRICS)), np.nan)
+    for p, (_, _, summary) in enumerate(entries):
+        stats = typed_stats(summary)
+        for f, fmt in enumerate(FORMATS):
+            record = stats.get(fmt) or {}
+            for m, metric in enumerate(METRICS):
+                value = record.get(metric)
+                if isinstance(value, (int, float)):
+                    values[p, f, m] = value
+    return StatsMatrix([e[0] for e in entries], [e[1] for e in entries], values)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = numerator / denominator
+    ratio[~np.isfinite(ratio)] = np.nan
+    return ratio
+
+
+def normalized_ranks(values: np.ndarray) -> np.ndarray:
+    """Rank players along axis 0, higher is better: 1.0 for the best, 0.0 for the worst.
+
+    Missing values stay NaN and don't count; ties go to the player listed first.
+    """
+    present = ~np.isnan(values)
+    order = np.argsort(-np.where(present, values, -np.inf), axis=0, kind="stable")
+    ranks = np.argsort(order, axis=0, kind="stable")  # 0 = best
+    counts = present.sum(axis=0)
+    normalized = 1.0 - ranks / np.maximum(counts - 1, 1)
+    return np.where(present, normalized, np.nan)
+
+
+def compare(matrix: StatsMatrix) -> Comparison:
+    """Derived metrics and ranks for every player, format and feature at once"""
+    runs_per_match = _ratio(matrix.metric("runs"), matrix.metric("matches"))
+    centuries_per_innings = _ratio(matrix.metric("centuries"), matrix.metric("innings"))
+    values = np.concatenate([matrix.values, runs_per_match[..., None], centuries_per_innings[..., None]], axis=2)
+
+    ranks = normalized_ranks(values)
+    counted = (~np.isnan(ranks)).sum(axis=(1, 2))
+    overall = np.where(counted > 0, np.nansum(ranks, axis=(1, 2)) / np.maximum(counted, 1), np.nan)
+    return Comparison(matrix, METRICS + DERIVED, values, ranks, overall)
+
+
+def _number(value) -> Optional[float]:
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else round(value, 4)
+
+
+def comparison_summary(comparison: Comparison) -> dict:
+    """JSON-ready comparison: per player and format, every feature with its normalized rank"""
+    matrix = comparison.matrix
+    position = {p: i + 1 for i, p in enumerate(comparison.ranking())}
+    players = []
+    for p, (key, name) in enumerate(zip(matrix.player_keys, matrix.player_names)):
+        formats = {}
+        for f, fmt in enumerate(FORMATS):
+            if np.isnan(comparison.values[p, f]).all():
+                continue
+            formats[fmt] = {feature: _number(comparison.values[p, f, k]) for k, feature in enumerate(comparison.features)}
+            formats[fmt]["ranks"] = {feature: _number(comparison.ranks[p, f, k])
+                                     for k, feature in enumerate(comparison.features)}
+        players.append({
+            "player_key": key,
+            "player_name": name,
+            "overall_score": _number(comparison.overall[p]),
+            "overall_rank": position[p] if not np.isnan(comparison.overall[p]) else None,
+            "formats": formats,
+        })
+    return {
+        "formats": list(FORMATS),
+        "metrics": list(METRICS),
+        "derived_metrics": list(DERIVED),
+        "ranking": [matrix.player_names[p] for p in comparison.ranking() if not np.isnan(comparison.overall[p])],
+        "players": players,
+    }
+
+
+def chart_data(comparison: Comparison) -> Tuple[List[str], list]:
+    """Player names and [(title, players x formats values)] for the renderer, best player first"""
+    order = comparison.ranking()
+    names = [comparison.matrix.player_names[p] for p in order]
+    return names, [(title, comparison.feature(feature)[order].tolist()) for title, feature in CHART_PANELS]
@@ -1,30 +1,256 @@
-from tavily import TavilyClient
 import os
+import threading
+import time
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
-from typing import Annotated
-import re
+from typing import Annotated, List
 import json
+import metrics
+from search_cache import get_search_cache
+from stages import SEARCH_CONCURRENCY
+from stats_parser import FORMATS, CareerStats, parse_career_stats
 
 load_dotenv()
 
-tavily = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+# Most targeted queries sent after the broad one, only for the formats it left unparsed;
+# each is an advanced-depth Tavily call, 0 keeps the single broad query
+SEARCH_FOLLOWUP_QUERIES = int(os.getenv("SEARCH_FOLLOWUP_QUERIES", "2"))
+# Longest a search waits for the broad query and its follow-ups together (seconds)
+SEARCH_MULTI_QUERY_TIMEOUT = float(os.getenv("SEARCH_MULTI_QUERY_TIMEOUT", "20"))
+
+BROAD_QUERY = "{player} cricket career statistics Test ODI T20I matches runs average centuries in a json format"
+TABLE_QUERY = "{player} wikipedia international career statistics batting table"
+FORMAT_QUERY = "{player} {format} cricket career batting statistics matches innings runs average 100s"
+# Tavily calls in flight across all players; by default every follow-up of every concurrent
+# search gets a thread, since a query waiting for one delays the whole search
+SEARCH_QUERY_CONCURRENCY = int(os.getenv("SEARCH_QUERY_CONCURRENCY", "0")) or \
+    SEARCH_CONCURRENCY * max(1, SEARCH_FOLLOWUP_QUERIES)
+
+# Created on the first search, so importing this module stays cheap
+tavily = None
+_tavily_lock = threading.Lock()
+
+
+def get_tavily():
+    """Shared Tavily client, created on first use"""
+    global tavily
+    if tavily is None:
+        with _tavily_lock:
+            if tavily is None:
+                from tavily import TavilyClient
+                tavily = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+    return tavily
+
+
+def _is_trusted(url: str, content: str) -> bool:
+    """Sources compact_search_results prefers: Wikipedia and pages with a career statistics section"""
+    return "wikipedia" in (url or "").lower() or "Career statistics" in (content or "")
+
+
+def decode_search_context(context):
+    """Decode get_search_context output into a list of {"url", "content"} dicts.
+
+    tavily-python JSON-encodes each source and then the list twice, so
+    unwrap string layers until we reach the list and its items.
+    """
+    decoded = json.loads(context)
+    while isinstance(decoded, str):
+        decoded = json.loads(decoded)
+    if isinstance(decoded, list):
+        decoded = [json.loads(item) if isinstance(item, str) else item for item in decoded]
+    return decoded
+
+
+def _decode_sources(context) -> list:
+    """Like decode_search_context, but [] for anything that isn't a list of sources"""
+    try:
+        decoded = decode_search_context(context)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return [s for s in decoded if isinstance(s, dict)] if isinstance(decoded, list) else []
+
+
+def merge_career_stats(sources: list) -> CareerStats:
+    """Per format, the stats of the first source that has them; trusted sources go first"""
+    merged = CareerStats()
+    for source in sorted(sources, key=lambda s: not _is_trusted(s.get("url"), s.get("content"))):
+        parsed = parse_career_stats(source.get("content") or "", url=source.get("url"))
+        for fmt in FORMATS:
+            if fmt not in merged.formats and fmt in parsed.formats:
+                merged.formats[fmt] = parsed.formats[fmt]
+    return merged
+
+
+class HedgedSearch():
+    """Tops up a player's broad Tavily query with targeted ones for the formats it missed.
+
+    The broad query goes out alone; a player it covers costs one call, as
+    before. If Test, ODI or T20I are left unparsed, up to `max_followups`
+    targeted queries for just those formats go out together and are parsed
+    as they arrive. Once every format is filled the queries still queued
+    are cancelled and the ones already running are left to finish
+    unobserved. After `timeout` seconds the search settles for whatever has
+    parsed.
+    """
+
+    def __init__(self, max_workers: int = SEARCH_QUERY_CONCURRENCY, timeout: float = SEARCH_MULTI_QUERY_TIMEOUT,
+                 max_followups: int = SEARCH_FOLLOWUP_QUERIES):
+        self.timeout = timeout
+        self.max_followups = max_followups
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tavily")
+        self._lock = threading.Lock()
+        self._counters = {"searches": 0, "queries": 0, "followup_searches": 0, "query_errors": 0,
+                          "early_stops": 0, "cancelled": 0, "abandoned": 0, "timeouts": 0, "incomplete": 0}
+
+    def followup_queries(self, player_name: str, missing: List[str]) -> List[str]:
+        queries = [FORMAT_QUERY.format(player=player_name, format=fmt) for fmt in missing]
+        if len(missing) > 1:
+            # One statistics table usually fills every missing format at once
+            queries.insert(0, TABLE_QUERY.format(player=player_name))
+        return queries[:max(self.max_followups, 0)]
+
+    def search(self, player_name: str, query: str) -> str:
+        """Sources that contributed stats (or the first one found), as a get_search_context style JSON list"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        kept, fallback = [], []
+        formats = set()
+        failures = []
+
+        def collect(sources) -> bool:
+            for source in sources:
+                parsed = parse_career_stats(source.get("content") or "", url=source.get("url"))
+                new_formats = set(parsed.formats) - formats
+                if new_formats or (parsed and _is_trusted(source.get("url"), source.get("content"))):
+                    kept.append(source)
+                    formats.update(new_formats)
+                elif not fallback:
+                    fallback.append(source)
+            return len(formats) == len(FORMATS)
+
+        self._count("searches")
+        sent, answered = 1, self._gather(player_name, [query], deadline, collect, failures)
+        followups = self.followup_queries(player_name, [fmt for fmt in FORMATS if fmt not in formats])
+        if followups and time.monotonic() < deadline:
+            self._count("followup_searches")
+            sent += len(followups)
+            answered += self._gather(player_name, followups, deadline, collect, failures)
+        if len(formats) < len(FORMATS):
+            self._count("incomplete")
+        print(f"[INFO] Search for {player_name}: {answered}/{sent} queries, "
+              f"formats {sorted(formats)} in {(time.monotonic() - started) * 1000:.0f}ms")
+        sources = kept or fallback
+        if not sources and failures and len(failures) == answered:
+            # Every query that answered failed (outage, bad key, quota): fail like the single query does
+            raise failures[-1]
+        return json.dumps(sources) if sources else ""
+
+    def _gather(self, player_name: str, queries: List[str], deadline: float, collect, failures: list) -> int:
+        """Send queries at once and feed their sources to `collect` until it reports every format.
+
+        Returns the number of queries that answered; the exceptions of failed
+        ones are appended to `failures`.
+        """
+        # Copy the context so each query's span lands in the request's timing breakdown
+        pending = {self._pool.submit(contextvars.copy_context().run, _fetch_context, query): query
+                   for query in queries}
+        self._count("queries", len(pending))
+        answered = 0
+        complete = False
+        try:
+            while pending and not complete:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("timeouts")
+                    break
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    query = pending.pop(future)
+                    answered += 1
+                    try:
+                        sources = _decode_sources(future.result())
+                    except Exception as e:
+                        print(f"[WARNING] Search query failed for {player_name} ({query}): {str(e)}")
+                        self._count("query_errors")
+                        failures.append(e)
+                        continue
+                    complete = collect(sources) or complete
+        finally:
+            if pending:
+                if complete:
+                    self._count("early_stops")
+                for future in pending:
+                    self._count("cancelled" if future.cancel() else "abandoned")
+        return answered
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["queries_per_search"] = round(stats["queries"] / stats["searches"], 2) if stats["searches"] else 0
+        return stats
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _fetch_context(query: str, max_results: int = 1):
+    with metrics.span("tavily_search"):
+        results = get_tavily().get_search_context(query=query, search_depth="advanced", max_results=max_results)
+    metrics.count_bytes("tavily", "in", len(str(results).encode("utf-8")))
+    return results
+
+
+_hedged_search = None
+_hedged_search_lock = threading.Lock()
+
+
+def get_hedged_search() -> HedgedSearch:
+    global _hedged_search
+    if _hedged_search is None:
+        with _hedged_search_lock:
+            if _hedged_search is None:
+                _hedged_search = HedgedSearch()
+    return _hedged_search
+
+
+def shutdown():
+    if _hedged_search is not None:
+        _hedged_search.shutdown()
 
 
 class direct_web_search():
     def __init__(self,player_name):
         self.player_name = player_name
 
-    def search_stats_tool(self) -> Annotated[str, "A list of results from the search"]:
-        query = f"{self.player_name} cricket career statistics Test ODI T20I matches runs average centuries in a json format"
-        return tavily.get_search_context(query=query, search_depth="advanced", max_results=1)
+    def search_stats_tool(self, refresh: bool = False) -> Annotated[str, "A list of results from the search"]:
+        """Search for the player's stats, served from the search cache unless `refresh` is set.
+
+        With SEARCH_FOLLOWUP_QUERIES the broad query is topped up with
+        targeted ones (Wikipedia table, one per format) for just the formats
+        it left unparsed.
+        """
+        query = BROAD_QUERY.format(player=self.player_name)
+
+        def fetch():
+            if SEARCH_FOLLOWUP_QUERIES > 0:
+                return get_hedged_search().search(self.player_name, query)
+            return _fetch_context(query)
+
+        with metrics.span("search_stats_tool"):
+            return get_search_cache().get_or_fetch(self.player_name, fetch, refresh=refresh)
         # content = tavily.get_search_context(query=query, search_depth="advanced", max_results=3)
         # return self._extract_key_stats(content)
 
 
-    def search_stats_compact(self) -> Annotated[dict, "Compact cricket statistics results"]:
+    def search_stats_compact(self, refresh: bool = False) -> Annotated[dict, "Compact cricket statistics results"]:
         """Optimized search for smaller context windows (like DeepSeek 6.7B)"""
         # Use the same successful approach as search_stats_tool
-        full_results = self.search_stats_tool()
+        full_results = self.search_stats_tool(refresh=refresh)
         
         # Automatically compact the results
         return self.compact_search_results(full_results)
@@ -53,6 +279,10 @@ class direct_web_search():
     
     def compact_search_results(self, full_results) -> dict:
         """Convert full search results to compact format for smaller models like DeepSeek 6.7B"""
+        with metrics.span("compact_search_results"):
+            return self._compact_search_results(full_results)
+
+    def _compact_search_results(self, full_results) -> dict:
         
         # If it's already a simple dict, return it
         if isinstance(full_results, dict) and 'results' in full_results:
@@ -62,27 +292,22 @@ class direct_web_search():
         if isinstance(full_results, str):
             # First try to parse as JSON string
             try:
-                parsed_results = json.loads(full_results)
+                parsed_results = self._decode_search_context(full_results)
                 if isinstance(parsed_results, list) and len(parsed_results) > 0:
-                    # Extract from first result (usually the best one)
+                    # Formats are merged across sources (a multi-query search keeps several);
+                    # the first result, usually the best one, names the result
                     best_result = parsed_results[0]
-                    content = best_result.get('content', '')
                     url = best_result.get('url', 'https://search_context')
+                    career_stats = merge_career_stats(parsed_results)
                     
                     # Format the cricket statistics
-                    formatted_stats = self._format_cricket_stats(content)
-                    
                     return {
                         "message": f"Cricket stats for {self.player_name}",
                         "player_name": self.player_name,
-                        "results": [
-                            {
-                                "url": url,
-                                "content": formatted_stats
-                            }
-                        ]
+                        "results": [{"url": url, "content": career_stats.summary_line(),
+                                     "stats": career_stats.to_dict()}]
                     }
-            except (json.JSONDecodeError, KeyError, IndexError):
+            except (json.JSONDecodeError, KeyError, IndexError, AttributeError):
                 # If JSON parsing fails, fall back to text extraction
                 pass
             
@@ -122,16 +347,10 @@ class direct_web_search():
             
             # Extract and format the statistics
             if best_content:
-                formatted_stats = self._format_cricket_stats(best_content)
                 return {
                     "message": f"Cricket stats for {self.player_name}",
                     "player_name": self.player_name,
-                    "results": [
-                        {
-                            "url": best_url,
-                            "content": formatted_stats
-                        }
-                    ]
+                    "results": [self._stats_result(best_url, best_content)]
                 }
         except Exception as e:
             print(f"Error processing results: {e}")
@@ -148,109 +367,18 @@ class direct_web_search():
             ]
         }
     
-    def _format_cricket_stats(self, content: str) -> str:
-        """Format cricket statistics using robust table parsing - handles malformed tables"""
-        # Remove commas from numbers for easier parsing
-        clean_content = content.replace(',', '')
-        
-        # Split into lines and identify table structure
-        lines = clean_content.split('\n')
-        stats_dict = {'Test': {}, 'ODI': {}, 'T20I': {}}
-        
-        # Find data rows for each format
-        for line in lines:
-            line = line.strip()
-            if '|' in line and any(fmt in line for fmt in ['Test', 'ODI', 'T20I']):
-                parts = [p.strip() for p in line.split('|')]
-                
-                # Identify format
-                format_name = None
-                for fmt in ['Test', 'ODI', 'T20I']:
-                    if fmt in parts[0]:
-                        format_name = fmt
-                        break
-                
-                if not format_name or len(parts) < 4:
-                    continue
-                
-                try:
-                    # Parse based on available columns
-                    format_stats = {}
-                    
-                    # Matches (usually column 1)
-                    if len(parts) > 1 and parts[1].isdigit():
-                        format_stats['matches'] = parts[1]
-                    
-                    # Runs (usually column 3 or 4)
-                    for i in [3, 4]:
-                        if len(parts) > i and parts[i].replace('.', '').isdigit():
-                            runs_val = int(float(parts[i]))
-                            if 100 <= runs_val <= 25000:  # Reasonable range
-                                format_stats['runs'] = str(runs_val)
-                                break
-                    
-                    # Average - look in multiple positions
-                    avg_found = False
-                    for i in [5, 6, 7]:
-                        if len(parts) > i and not avg_found:
-                            avg_str = parts[i].replace(' ', '')
-                            if re.match(r'^\d+\.\d+$', avg_str):
-                                avg_val = float(avg_str)
-                                if 10.0 <= avg_val <= 70.0:  # Reasonable batting average
-                                    format_stats['avg'] = avg_str
-                                    avg_found = True
-                    
-                    # Centuries - look for patterns like "33/6" or "73/10"
-                    for i in range(len(parts)):
-                        if '/' in parts[i]:
-                            cent_parts = parts[i].split('/')
-                            if len(cent_parts) >= 2 and cent_parts[1].isdigit():
-                                cent_val = int(cent_parts[1])
-                                if 0 <= cent_val <= 80:  # Reasonable centuries count
-                                    format_stats['centuries'] = cent_parts[1]
-                                    break
-                    
-                    # Store if we have meaningful data
-                    if len(format_stats) >= 2:
-                        stats_dict[format_name] = format_stats
-                        
-                except (ValueError, IndexError):
-                    continue
-        
-        # Build formatted output
-        if any(stats_dict.values()):
-            result_parts = []
-            for fmt in ['Test', 'ODI', 'T20I']:
-                if stats_dict[fmt]:
-                    stats = stats_dict[fmt]
-                    matches = stats.get('matches', '0')
-                    runs = stats.get('runs', '0')
-                    avg = stats.get('avg', '0.0')
-                    centuries = stats.get('centuries', '0')
-                    
-                    result_parts.append(f"{fmt}: {matches} matches, {runs} runs, avg {avg}, {centuries} centuries")
-            
-            if result_parts:
-                return f"Career statistics: {'. '.join(result_parts)}."
-        
-        # Ultimate fallback: try basic regex patterns
-        test_match = re.search(r'Test.*?(\d+).*?(\d{3,5}).*?([\d\.]+).*?(\d+)', clean_content)
-        odi_match = re.search(r'ODI.*?(\d+).*?(\d{3,5}).*?([\d\.]+).*?(\d+)', clean_content)
-        t20_match = re.search(r'T20I.*?(\d+).*?(\d{3,5}).*?([\d\.]+).*?(\d+)', clean_content)
-        
-        if test_match or odi_match or t20_match:
-            result_parts = []
-            if test_match:
-                result_parts.append(f"Test: {test_match.group(1)} matches, {test_match.group(2)} runs, avg {test_match.group(3)}, {test_match.group(4)} centuries")
-            if odi_match:
-                result_parts.append(f"ODI: {odi_match.group(1)} matches, {odi_match.group(2)} runs, avg {odi_match.group(3)}, {odi_match.group(4)} centuries")
-            if t20_match:
-                result_parts.append(f"T20I: {t20_match.group(1)} matches, {t20_match.group(2)} runs, avg {t20_match.group(3)}, {t20_match.group(4)} centuries")
-            
-            return f"Career statistics: {'. '.join(result_parts)}."
-        
-        # If no patterns match, return empty string
-        return ""
-
+    def _decode_search_context(self, context: str):
+        return decode_search_context(context)
 
+    def _format_cricket_stats(self, content: str, url: str = None) -> CareerStats:
+        """Parse per-format stats (matches, runs, avg, centuries + provenance) in one pass over the page"""
+        return parse_career_stats(content, url=url)
 
+    def _stats_result(self, url: str, content: str) -> dict:
+        """One compact result: typed per-format stats plus a readable one-line rendering"""
+        career_stats = self._format_cricket_stats(content, url=url)
+        return {
+            "url": url,
+            "content": career_stats.summary_line(),
+            "stats": career_stats.to_dict()
+        }
@@ -0,0 +1,266 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+import metrics
+from stages import SANDBOX_CONCURRENCY
+
+load_dotenv()
+
+SANDBOX_IMAGE = os.getenv("DOCKER_IMAGE", "cricket-sandbox:latest")
+SANDBOX_DOCKERFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox")
+DOCKER_TIMEOUT = int(os.getenv("DOCKER_TIMEOUT", "600"))
+
+EXECUTOR_POOL_MIN = int(os.getenv("EXECUTOR_POOL_MIN", "1"))
+EXECUTOR_POOL_MAX = int(os.getenv("EXECUTOR_POOL_MAX", str(SANDBOX_CONCURRENCY)))
+EXECUTOR_MAX_USES = int(os.getenv("EXECUTOR_MAX_USES", "25"))
+EXECUTOR_POOL_DIR = os.getenv("EXECUTOR_POOL_DIR", "./docker_tmp/pool")
+# Start min_size containers when the app starts; otherwise the first CodeGen run starts them
+EXECUTOR_POOL_WARM_ON_START = os.getenv("EXECUTOR_POOL_WARM_ON_START", "false").lower() in ("1", "true", "yes")
+
+# Exit code from `timeout` inside the container; the run may have left processes behind
+_TIMEOUT_EXIT_CODE = 124
+
+
+class PooledSandbox():
+    """One warm container plus the host directory bind-mounted as its /workspace"""
+
+    def __init__(self, executor, work_dir):
+        self.executor = executor
+        self.work_dir = work_dir
+        self.uses = 0
+        self.created_at = time.time()
+
+    def healthy(self) -> bool:
+        try:
+            container = self.executor._container
+            container.reload()
+            return container.status == "running"
+        except Exception:
+            return False
+
+    def reset_workspace(self):
+        for name in os.listdir(self.work_dir):
+            path = os.path.join(self.work_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    def stop(self):
+        try:
+            self.executor.stop()
+        except Exception as e:
+            print(f"[WARNING] Failed to stop sandbox container: {e}")
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class ExecutorPool():
+    """Pool of warm DockerCommandLineCodeExecutors built from the pre-baked sandbox image.
+
+    `checkout()` hands out an idle, health-checked container, creating one
+    only while fewer than `max_size` exist and blocking otherwise, so the pool
+    size is also the sandbox concurrency limit. Containers are recycled after
+    `max_uses` executions, after a timeout, or when a health check fails, and
+    replacements are started in the background to keep `min_size` warm.
+    """
+
+    def __init__(self, image=SANDBOX_IMAGE, timeout=DOCKER_TIMEOUT, min_size=EXECUTOR_POOL_MIN,
+                 max_size=EXECUTOR_POOL_MAX, max_uses=EXECUTOR_MAX_USES, root_dir=EXECUTOR_POOL_DIR):
+        self.image = image
+        self.timeout = timeout
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.root_dir = root_dir
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._total = 0  # idle + checked out + being created
+        self._closed = False
+        self._image_lock = threading.Lock()
+        self._image_ready = False
+        self._counters = {"checkouts": 0, "created": 0, "recycled": 0, "unhealthy": 0, "wait_seconds": 0.0}
+
+    def _ensure_image(self):
+        with self._image_lock:
+            if self._image_ready:
+                return
+            import docker
+            from docker.errors import ImageNotFound
+
+            client = docker.from_env()
+            try:
+                client.images.get(self.image)
+            except ImageNotFound:
+                if self.image == "cricket-sandbox:latest":
+                    print(f"[INFO] Building sandbox image {self.image} from {SANDBOX_DOCKERFILE_DIR}...")
+                    client.images.build(path=SANDBOX_DOCKERFILE_DIR, tag=self.image, rm=True)
+                else:
+                    print(f"[INFO] Pulling sandbox image {self.image}...")
+                    client.images.pull(self.image)
+            self._image_ready = True
+
+    def _create(self) -> PooledSandbox:
+        from autogen.coding import DockerCommandLineCodeExecutor
+
+        self._ensure_image()
+        os.makedirs(self.root_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix="slot_", dir=self.root_dir)
+        with metrics.span("sandbox_container_start"):
+            executor = DockerCommandLineCodeExecutor(image=self.image, timeout=self.timeout, work_dir=work_dir)
+        with self._cond:
+            self._counters["created"] += 1
+        return PooledSandbox(executor, work_dir)
+
+    def _discard(self, sandbox: PooledSandbox):
+        """Stop a container and start a replacement if the pool dropped below min_size"""
+        sandbox.stop()
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+        self._top_up()
+
+    def _top_up(self):
+        with self._cond:
+            missing = 0 if self._closed else self.min_size - self._total
+            self._total += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            threading.Thread(target=self._add_idle, daemon=True).start()
+
+    def _add_idle(self):
+        try:
+            sandbox = self._create()
+        except Exception as e:
+            print(f"[WARNING] Failed to start sandbox container: {e}")
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            if self._closed:
+                self._total -= 1
+                sandbox.stop()
+                return
+            self._idle.append(sandbox)
+            self._cond.notify()
+
+    def warm(self):
+        """Start min_size containers in the background"""
+        self._top_up()
+
+    @contextmanager
+    def checkout(self):
+        started = time.monotonic()
+        sandbox = None
+        while sandbox is None:
+            create = False
+            with self._cond:
+                while not self._idle and self._total >= self.max_size and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    raise RuntimeError("Executor pool is shut down")
+                if self._idle:
+                    sandbox = self._idle.pop()
+                else:
+                    self._total += 1
+                    create = True
+
+            if create:
+                try:
+                    sandbox = self._create()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            elif not sandbox.healthy():
+                with self._cond:
+                    self._counters["unhealthy"] += 1
+                self._discard(sandbox)
+                sandbox = None
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._counters["checkouts"] += 1
+            self._counters["wait_seconds"] += waited
+        metrics.record_span("sandbox_checkout", waited)
+
+        reusable = False
+        try:
+            yield sandbox
+            reusable = True
+        finally:
+            self._checkin(sandbox, reusable)
+
+    def _checkin(self, sandbox: PooledSandbox, reusable: bool):
+        sandbox.uses += 1
+        try:
+            sandbox.reset_workspace()
+        except OSError:
+            reusable = False
+        if not reusable or sandbox.uses >= self.max_uses or self._closed:
+            with self._cond:
+                self._counters["recycled"] += 1
+            self._discard(sandbox)
+            return
+        with self._cond:
+            self._idle.append(sandbox)
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update({"idle": len(self._idle), "total": self._total,
+                          "min_size": self.min_size, "max_size": self.max_size})
+        return stats
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for sandbox in idle:
+            sandbox.stop()
+
+
+def run_in_sandbox(pool: ExecutorPool, code_blocks, work_dir: str):
+    """Execute code blocks in a pooled container as if `work_dir` were its workspace.
+
+    The request's files are staged into the container's workspace before the
+    run and everything in it is copied back afterwards, so state carries over
+    between turns even when each turn lands on a different container.
+    """
+    with pool.checkout() as sandbox:
+        shutil.copytree(work_dir, sandbox.work_dir, dirs_exist_ok=True)
+        with metrics.span("sandbox_execution"):
+            result = sandbox.executor.execute_code_blocks(code_blocks)
+        shutil.copytree(sandbox.work_dir, work_dir, dirs_exist_ok=True)
+        if result.exit_code == _TIMEOUT_EXIT_CODE:
+            # Don't hand a container with a runaway process to the next request
+            sandbox.uses = pool.max_uses
+    return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_executor_pool() -> ExecutorPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ExecutorPool()
+    return _pool
+
+
+def shutdown():
+    if _pool is not None:
+        _pool.shutdown()
@@ -0,0 +1,293 @@
+"""Bulk offline ingestion of saved search pages into the stats store.
+
+Reads a JSONL dump (one record per line) or a directory of saved pages,
+parses them with compact_search_results across a process pool in chunks,
+and writes every player whose stats parse to the stats store, so the API
+serves them without a web search.
+
+JSONL records (and .json files in a directory) are objects with the player
+in "player_name" (or "player") and the page in one of:
+  "context"   a get_search_context result, as cached by the search stage
+  "results"   a Tavily search() result list of {"url", "content"}
+  "content"   plain page text, with an optional "url"
+Any other file in a directory is page text for the player named by the
+file name ("virat_kohli.txt" -> "Virat Kohli").
+
+Progress is checkpointed after every chunk; rerunning the same command
+resumes after the last finished chunk (--restart starts over). Records that
+fail or parse no stats are appended to the error log with the reason; on
+resume, the error log and --output are cut back to their checkpointed size.
+Memory stays flat: input is streamed and at most 2 chunks per worker are
+in flight.
+
+    python backend/ingest.py dump.jsonl [--workers 8] [--chunk-size 200] [--output parsed.jsonl]
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or os.cpu_count() or 2
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "200"))
+# Seconds between progress lines
+PROGRESS_INTERVAL = 5.0
+
+
+def _context_of(record: dict):
+    """The saved page of a record, in a form compact_search_results parses"""
+    if record.get("context"):
+        return record["context"]
+    if isinstance(record.get("results"), list):
+        sources = [{"url": r.get("url"), "content": r.get("content", "")} for r in record["results"] if isinstance(r, dict)]
+        return json.dumps(sources)
+    if record.get("content"):
+        return json.dumps([{"url": record.get("url"), "content": record["content"]}])
+    raise ValueError("record has no context, results or content")
+
+
+def _read_item(kind: str, value: str) -> dict:
+    """A raw JSONL line or a file path as a record dict"""
+    if kind == "line":
+        record = json.loads(value)
+        if not isinstance(record, dict):
+            raise ValueError("line is not a JSON object")
+        return record
+    with open(value, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    name = os.path.splitext(os.path.basename(value))[0].replace("_", " ").replace("-", " ").title()
+    if value.endswith(".json"):
+        record = json.loads(text)
+        if isinstance(record, dict):
+            record.setdefault("player_name", record.get("player") or name)
+            return record
+    return {"player_name": name, "content": text}
+
+
+def _parse_record(kind: str, value: str) -> dict:
+    from direct_search import direct_web_search
+    from name_resolver import canonicalize
+    from stats_store import typed_stats
+
+    record = _read_item(kind, value)
+    player_name = record.get("player_name") or record.get("player")
+    if not player_name or not str(player_name).strip():
+        raise ValueError("record has no player_name")
+    player_name = str(player_name).strip()
+    summary = direct_web_search(player_name).compact_search_results(_context_of(record))
+    result = {"player_name": player_name, "player_key": canonicalize(player_name)}
+    if not typed_stats(summary):
+        return {**result, "status": "no_stats", "error": "no per-format stats parsed"}
+    return {**result, "status": "ok", "summary": summary}
+
+
+def parse_chunk(chunk: list) -> list:
+    """Parse (index, kind, value) items in a worker; one result per item, never raises"""
+    results = []
+    for index, kind, value in chunk:
+        try:
+            result = _parse_record(kind, value)
+        except Exception as e:
+            result = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        result["index"] = index
+        if result["status"] != "ok" and kind == "file":
+            result["source"] = value
+        results.append(result)
+    return results
+
+
+def _init_worker():
+    # Workers share nothing with the parent; import the parser once per worker
+    import direct_search  # noqa: F401
+
+
+def iter_input(path: str, start: int = 0, offset: int = 0):
+    """Yield (index, kind, value, next_offset) from a JSONL file or a directory, resuming at `start`.
+
+    JSONL is resumed by byte offset; a directory by position in its sorted
+    file listing (only the names are held in memory).
+    """
+    if os.path.isdir(path):
+        names = sorted(entry.name for entry in os.scandir(path) if entry.is_file() and not entry.name.startswith("."))
+        for index in range(start, len(names)):
+            yield index, "file", os.path.join(path, names[index]), 0
+        return
+
+    index = start
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            text = line.decode("utf-8", errors="replace").strip()
+            if text:
+                yield index, "line", text, offset
+                index += 1
+
+
+def iter_chunks(items, chunk_size: int):
+    chunk = []
+    for index, kind, value, offset in items:
+        chunk.append((index, kind, value))
+        if len(chunk) >= chunk_size:
+            yield chunk, index + 1, offset
+            chunk = []
+    if chunk:
+        yield chunk, chunk[-1][0] + 1, offset
+
+
+def load_checkpoint(path: str, input_path: str) -> dict:
+    empty = {"input": input_path, "records": 0, "offset": 0, "ok": 0, "no_stats": 0, "errors": 0, "stored": 0,
+             "logs": {}}
+    if not os.path.exists(path):
+        return empty
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != input_path:
+        raise SystemExit(f"[ERROR] Checkpoint {path} belongs to {checkpoint.get('input')}; pass --restart "
+                         f"or another --checkpoint")
+    return {**empty, **checkpoint}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Write-then-rename, so a crash never leaves half a checkpoint
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def open_log(path: str, checkpoint: dict):
+    """Open a JSONL log for appending, cut back to its size at the last checkpoint.
+
+    Lines written for a chunk whose checkpoint never got saved would
+    otherwise be written again when the chunk is redone on resume.
+    """
+    f = open(path, "a", encoding="utf-8")
+    size = checkpoint["logs"].get(os.path.abspath(path))
+    if size is not None and f.tell() > size:
+        f.truncate(size)
+    return f
+
+
+def ingest(args) -> dict:
+    from stats_store import get_stats_store
+
+    input_path = os.path.abspath(args.input)
+    checkpoint_path = args.checkpoint or f"{input_path.rstrip(os.sep)}.ingest-checkpoint.json"
+    errors_path = args.errors or f"{input_path.rstrip(os.sep)}.ingest-errors.jsonl"
+    if args.restart:
+        for path in (checkpoint_path, errors_path):
+            if os.path.exists(path):
+                os.remove(path)
+    checkpoint = load_checkpoint(checkpoint_path, input_path)
+    if checkpoint["records"]:
+        print(f"[INFO] Resuming after record {checkpoint['records']} from {checkpoint_path}")
+
+    store = None if args.no_store else get_stats_store()
+    errors_file = open_log(errors_path, checkpoint)
+    output_file = open_log(args.output, checkpoint) if args.output else None
+    chunks = iter_chunks(iter_input(input_path, checkpoint["records"], checkpoint["offset"]), args.chunk_size)
+
+    started = time.perf_counter()
+    processed = 0
+    last_progress = started
+    # Results are taken in submission order, so the checkpoint only ever covers finished chunks
+    in_flight = collections.deque()
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker)
+    try:
+        while True:
+            while len(in_flight) < args.workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                records, end, offset = chunk
+                in_flight.append((pool.submit(parse_chunk, records), end, offset))
+            if not in_flight:
+                break
+
+            future, end, offset = in_flight.popleft()
+            results = future.result()
+            parsed = [r for r in results if r["status"] == "ok"]
+            if store is not None and parsed:
+                checkpoint["stored"] += store.put_many([(r["player_key"], r["summary"], r["player_name"])
+                                                        for r in parsed])
+            if output_file is not None:
+                for r in parsed:
+                    output_file.write(json.dumps({"player_key": r["player_key"], "player_name": r["player_name"],
+                                                  "summary": r["summary"]}) + "\n")
+                output_file.flush()
+            for r in results:
+                if r["status"] != "ok":
+                    errors_file.write(json.dumps({k: r.get(k) for k in
+                                                  ("index", "source", "player_name", "status", "error")}) + "\n")
+            errors_file.flush()
+
+            checkpoint["ok"] += len(parsed)
+            checkpoint["no_stats"] += sum(r["status"] == "no_stats" for r in results)
+            checkpoint["errors"] += sum(r["status"] == "error" for r in results)
+            checkpoint["records"], checkpoint["offset"] = end, offset
+            for f in (errors_file, output_file):
+                if f is not None:
+                    checkpoint["logs"][os.path.abspath(f.name)] = f.tell()
+            save_checkpoint(checkpoint_path, checkpoint)
+            processed += len(results)
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                print(f"[INFO] {checkpoint['records']} records ({processed / (now - started):.0f}/s), "
+                      f"{checkpoint['ok']} ok, {checkpoint['no_stats']} no stats, {checkpoint['errors']} errors")
+    finally:
+        for future, _, _ in in_flight:
+            future.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+        errors_file.close()
+        if output_file is not None:
+            output_file.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **checkpoint,
+        "processed_this_run": processed,
+        "elapsed_s": round(elapsed, 2),
+        "records_per_s": round(processed / elapsed, 1) if elapsed > 0 else 0.0,
+        "workers": args.workers,
+        "chunk_size": args.chunk_size,
+        "checkpoint": checkpoint_path,
+        "error_log": errors_path,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file or directory of saved pages")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <input>.ingest-checkpoint.json)")
+    parser.add_argument("--errors", help="error log, JSONL (default: <input>.ingest-errors.jsonl)")
+    parser.add_argument("--output", help="also append parsed summaries to this JSONL file")
+    parser.add_argument("--no-store", action="store_true", help="don't write to the stats store")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("--workers and --chunk-size must be at least 1")
+
+    report = ingest(args)
+    print(f"[SUCCESS] {report['processed_this_run']} records in {report['elapsed_s']}s "
+          f"({report['records_per_s']} records/s, {report['workers']} workers, chunks of {report['chunk_size']})")
+    print(f"[INFO] Totals: {report['records']} records, {report['ok']} ok, {report['stored']} stored, "
+          f"{report['no_stats']} no stats, {report['errors']} errors (see {report['error_log']})")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# How long a finished job's result is handed to new jobs for the same player
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "86400"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+TERMINAL = (SUCCEEDED, FAILED)
+
+_COLUMNS = ("id", "player_name", "player_key", "chart", "refresh", "status",
+            "created_at", "started_at", "finished_at", "result", "error")
+
+
+class JobStore():
+    """Job rows in SQLite, so queued work and finished results outlive the process"""
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, player_name TEXT NOT NULL, player_key TEXT NOT NULL,"
+            " chart INTEGER NOT NULL, refresh INTEGER NOT NULL, status TEXT NOT NULL,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL, result TEXT, error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_player ON jobs(player_key, status)")
+        self._db.commit()
+
+    def _row(self, row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["chart"] = bool(job["chart"])
+        job["refresh"] = bool(job["refresh"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, player_name: str, player_key: str, chart: bool, refresh: bool) -> dict:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, player_name, player_key, chart, refresh, status, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, player_name, player_key, int(chart), int(refresh), QUEUED, time.time()),
+            )
+            self._db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def find_reusable(self, player_key: str, chart: bool, max_age: float) -> Optional[dict]:
+        """Newest job for this player that is still in flight or finished within max_age.
+
+        A chart request can only reuse a job that was asked for a chart too.
+        """
+        chart_clause = "AND chart = 1" if chart else ""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+                f" WHERE player_key = ? {chart_clause}"
+                "  AND (status IN (?, ?) OR (status = ? AND finished_at >= ?))"
+                " ORDER BY created_at DESC LIMIT 1",
+                (player_key, QUEUED, RUNNING, SUCCEEDED, time.time() - max_age),
+            ).fetchone()
+        return self._row(row)
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def mark_running(self, job_id: str):
+        self._update(job_id, status=RUNNING, started_at=time.time())
+
+    def finish(self, job_id: str, result: dict):
+        self._update(job_id, status=SUCCEEDED, finished_at=time.time(), result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str):
+        self._update(job_id, status=FAILED, finished_at=time.time(), error=error)
+
+    def requeue_unfinished(self) -> list:
+        """Reset jobs a previous process left queued or running; returns their ids, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+            self._db.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+            self._db.commit()
+        return [row[0] for row in rows]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue():
+    """Background workers that run submitted jobs through `runner(job, on_event)`.
+
+    Jobs are persisted before they are queued, so anything left unfinished
+    by a restart is picked up again on `start()`. Progress events from the
+    runner (which may arrive from worker threads) are fanned out to every
+    subscriber of the job.
+    """
+
+    def __init__(self, runner: Callable[..., Awaitable[dict]], store: Optional[JobStore] = None,
+                 workers: int = JOB_WORKERS, result_ttl: float = JOB_RESULT_TTL,
+                 reusable: Optional[Callable[[dict], bool]] = None):
+        self.runner = runner
+        self.store = store
+        self.workers = max(workers, 1)
+        self.result_ttl = result_ttl
+        # Extra check on a finished result before handing it out again (e.g. chart still stored)
+        self.reusable = reusable or (lambda result: True)
+
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self._stages = {}  # job id -> last progress event of a running job
+        self._subscribers = {}  # job id -> [asyncio.Queue]
+        self._counters = {"submitted": 0, "reused": 0, "completed": 0, "failed": 0, "requeued": 0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        if self.store is None:
+            self.store = await asyncio.to_thread(JobStore)
+        for job_id in await asyncio.to_thread(self.store.requeue_unfinished):
+            self._counters["requeued"] += 1
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            self.store.close()
+
+    async def submit(self, player_name: str, player_key: str, chart: bool = True, refresh: bool = False):
+        """Queue a job, or hand back an in-flight or recent one for the same player. Returns (job, reused)"""
+        if not refresh:
+            job = await asyncio.to_thread(self.store.find_reusable, player_key, chart, self.result_ttl)
+            if job is not None and (job["status"] != SUCCEEDED or self.reusable(job["result"])):
+                self._counters["reused"] += 1
+                return self._with_stage(job), True
+
+        job = await asyncio.to_thread(self.store.create, player_name, player_key, chart, refresh)
+        self._counters["submitted"] += 1
+        self._queue.put_nowait(job["id"])
+        self._publish(job["id"], {"event": "job_queued", "job_id": job["id"]})
+        return job, False
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        return self._with_stage(job) if job is not None else None
+
+    def _with_stage(self, job: dict) -> dict:
+        job["stage"] = self._stages.get(job["id"], {}).get("event") if job["status"] == RUNNING else None
+        return job
+
+    async def subscribe(self, job_id: str):
+        """Async iterator of events for a job: its current state first, then progress until it ends"""
+        queue = asyncio.Queue()
+        # Subscribe before reading the state, so a job finishing in between isn't missed
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None:
+                return
+            yield {"event": "job_state", **job}
+            if job["status"] in TERMINAL:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in ("job_succeeded", "job_failed"):
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id, [])
+            subscribers.remove(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def _publish(self, job_id: str, event: dict):
+        if event["event"] not in ("job_queued", "job_succeeded", "job_failed"):
+            self._stages[job_id] = event
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    def _progress(self, job_id: str):
+        """on_event callback for the runner; safe to call from any thread"""
+        def on_event(event, **data):
+            item = {"event": event, "job_id": job_id, **data}
+            self._loop.call_soon_threadsafe(self._publish, job_id, item)
+        return on_event
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"[ERROR] Job worker crashed on {job_id}: {str(e)}")
+
+    async def _run(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job["status"] in TERMINAL:
+            return
+        await asyncio.to_thread(self.store.mark_running, job_id)
+        self._publish(job_id, {"event": "job_started", "job_id": job_id})
+        try:
+            result = await self.runner(job, self._progress(job_id))
+        except Exception as e:
+            print(f"[ERROR] Job {job_id} for {job['player_name']} failed: {str(e)}")
+            await asyncio.to_thread(self.store.fail, job_id, str(e))
+            self._counters["failed"] += 1
+            self._finish(job_id, {"event": "job_failed", "job_id": job_id, "error": str(e)})
+            return
+        await asyncio.to_thread(self.store.finish, job_id, result)
+        self._counters["completed"] += 1
+        self._finish(job_id, {"event": "job_succeeded", "job_id": job_id, "result": result})
+
+    def _finish(self, job_id: str, event: dict):
+        # Let progress events already scheduled from worker threads go out first
+        def publish():
+            self._stages.pop(job_id, None)
+            self._publish(job_id, event)
+        self._loop.call_soon(publish)
+
+    def stats(self) -> dict:
+        stats = dict(self._counters)
+        stats.update({"workers": self.workers, "queued": self._queue.qsize() if self._queue else 0,
+                      "running": len(self._stages), "by_status": self.store.counts() if self.store else {}})
+        return stats
@@ -0,0 +1,301 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+import metrics
+from stages import LLM_CONCURRENCY
+
+load_dotenv()
+
+# Entries of llm_config_dict that CodeGen may be routed to
+LLM_ROUTER_BACKENDS = [name.strip() for name in
+                       os.getenv("LLM_ROUTER_BACKENDS", "openai_code_config,code_generation").split(",") if name.strip()]
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+# A backend failing this many times in a row is skipped for LLM_BREAKER_COOLDOWN seconds
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# Hedging: when the chosen backend is slower than its own LLM_HEDGE_PERCENTILE latency,
+# send the same request to the next best backend and take whichever answers first
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Requests a backend serves at once before the rest queue; LM Studio generates one at a time
+LLM_LOCAL_PARALLELISM = int(os.getenv("LLM_LOCAL_PARALLELISM", "1"))
+LLM_HOSTED_PARALLELISM = int(os.getenv("LLM_HOSTED_PARALLELISM", "8"))
+
+EWMA_ALPHA = 0.2
+LATENCY_WINDOW = 200
+MESSAGE_FIELDS = ("role", "content", "name")
+
+
+def _is_local(base_url: Optional[str]) -> bool:
+    return bool(base_url) and urlparse(base_url).hostname in ("localhost", "127.0.0.1", "::1")
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+@dataclass
+class RoutedReply:
+    content: str
+    backend: str
+    model: str
+    seconds: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    hedged: bool = False
+
+
+class LLMBackend():
+    """One OpenAI-compatible endpoint with its observed latency, error rate and queue depth.
+
+    The client (and its keep-alive connection pool) is created on the first
+    call and lives as long as the process, instead of one client per chat.
+    """
+
+    def __init__(self, name: str, config: dict, parallelism: Optional[int] = None, timeout=LLM_REQUEST_TIMEOUT):
+        self.name = name
+        self.model = config["model"]
+        self.base_url = config.get("base_url")
+        self.parallelism = parallelism or (LLM_LOCAL_PARALLELISM if _is_local(self.base_url) else LLM_HOSTED_PARALLELISM)
+        self.timeout = timeout
+        self.api_key = config.get("api_key")
+        self._client = None
+        self._client_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ewma_latency = None  # seconds, successful calls only
+        self.error_rate = 0.0
+        self.inflight = 0
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._counters = {"requests": 0, "errors": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # openai and httpx take about half a second to import; pay for it on the first call
+                    import httpx
+                    from openai import OpenAI
+
+                    pool_size = max(self.parallelism, LLM_CONCURRENCY) * 2
+                    self._client = OpenAI(
+                        api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout,
+                        http_client=httpx.Client(timeout=self.timeout, limits=httpx.Limits(
+                            max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=120)),
+                    )
+        return self._client
+
+    def available(self) -> bool:
+        """False while the breaker is open after repeated failures"""
+        return time.monotonic() >= self._open_until
+
+    def expected_latency(self) -> float:
+        """Observed latency, stretched by the requests queued ahead and discounted by reliability.
+
+        Untried backends score 0, so each gets tried; one that has only
+        ever failed counts as slow as a timeout.
+        """
+        with self._lock:
+            if self.ewma_latency is not None:
+                latency = self.ewma_latency
+            else:
+                latency = self.timeout if self._counters["errors"] else 0.0
+            queued = max(0, self.inflight + 1 - self.parallelism)
+            error_rate = self.error_rate
+        return latency * (1 + queued / self.parallelism) / max(0.05, 1 - error_rate)
+
+    def hedge_threshold(self, percentile: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            latencies = list(self._latencies)
+        return _percentile(latencies, percentile)
+
+    def complete(self, messages: list):
+        with self._lock:
+            self.inflight += 1
+            self._counters["requests"] += 1
+        started = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(model=self.model, messages=messages)
+        except Exception:
+            self._record(time.perf_counter() - started, ok=False)
+            raise
+        self._record(time.perf_counter() - started, ok=True)
+        return response
+
+    def _record(self, seconds: float, ok: bool):
+        metrics.record_span("llm_request", seconds, backend=self.name)
+        metrics.llm_requests.inc(backend=self.name, outcome="ok" if ok else "error")
+        with self._lock:
+            self.inflight -= 1
+            self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+            if ok:
+                self._consecutive_failures = 0
+                self._latencies.append(seconds)
+                self.ewma_latency = seconds if self.ewma_latency is None else \
+                    self.ewma_latency + EWMA_ALPHA * (seconds - self.ewma_latency)
+                return
+            self._counters["errors"] += 1
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= LLM_BREAKER_FAILURES:
+                self._open_until = time.monotonic() + LLM_BREAKER_COOLDOWN
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+            stats = dict(self._counters)
+            stats.update({
+                "model": self.model,
+                "inflight": self.inflight,
+                "parallelism": self.parallelism,
+                "error_rate": round(self.error_rate, 4),
+                "ewma_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            })
+        stats["p50_ms"] = round(_percentile(latencies, 50) * 1000, 1) if latencies else None
+        stats["p95_ms"] = round(_percentile(latencies, 95) * 1000, 1) if latencies else None
+        stats["available"] = self.available()
+        return stats
+
+
+class LLMRouter():
+    """Sends each CodeGen LLM call to the backend expected to answer first.
+
+    A chat sticks to the backend it started on unless that backend's breaker
+    opens. A failed call is retried once on the next best backend; with
+    hedging on, a call still running past the backend's latency percentile is
+    also sent to the next best backend and the first answer wins. `fits`
+    limits a call to backends that can take its prompt.
+    """
+
+    def __init__(self, backends, hedge=LLM_HEDGE_ENABLED, hedge_percentile=LLM_HEDGE_PERCENTILE,
+                 hedge_min_samples=LLM_HEDGE_MIN_SAMPLES):
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0}
+        # Hedged calls run both requests on these threads; a losing request is left to finish
+        self._hedge_pool = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY * 4, thread_name_prefix="llm-hedge")
+
+    @classmethod
+    def from_configs(cls, configs: dict, names=LLM_ROUTER_BACKENDS, **kwargs):
+        backends = []
+        for name in names:
+            if name not in configs:
+                print(f"[WARNING] LLM backend {name} is not configured, skipping it")
+                continue
+            if not configs[name].get("api_key"):
+                print(f"[WARNING] LLM backend {name} has no api_key, skipping it")
+                continue
+            backends.append(LLMBackend(name, configs[name]))
+        return cls(backends, **kwargs)
+
+    def choose(self, exclude=(), fits: Optional[Callable[[LLMBackend], bool]] = None) -> Optional[LLMBackend]:
+        candidates = [b for b in self.backends if b not in exclude and (fits is None or fits(b))]
+        # If every breaker is open, trying one beats failing outright
+        available = [b for b in candidates if b.available()] or candidates
+        if not available:
+            return None
+        return min(available, key=lambda b: (b.expected_latency(), self.backends.index(b)))
+
+    def complete(self, messages: list, primary: Optional[LLMBackend] = None,
+                 fits: Optional[Callable[[LLMBackend], bool]] = None) -> RoutedReply:
+        messages = [{k: m[k] for k in MESSAGE_FIELDS if k in m} for m in messages]
+        if primary is None or not primary.available():
+            primary = self.choose(fits=fits)
+        if primary is None:
+            raise RuntimeError("No LLM backend is configured")
+        self._count("calls")
+
+        started = time.perf_counter()
+        hedged = False
+        try:
+            threshold = primary.hedge_threshold(self.hedge_percentile, self.hedge_min_samples) if self.hedge else None
+            if threshold is None:
+                response, backend = primary.complete(messages), primary
+            else:
+                response, backend, hedged = self._hedged(messages, primary, threshold, fits)
+        except Exception as e:
+            fallback = self.choose(exclude=(primary,), fits=fits)
+            if fallback is None:
+                raise
+            print(f"[WARNING] LLM backend {primary.name} failed ({e}), retrying on {fallback.name}")
+            self._count("failovers")
+            response, backend = fallback.complete(messages), fallback
+
+        usage = getattr(response, "usage", None)
+        return RoutedReply(
+            content=response.choices[0].message.content or "",
+            backend=backend.name,
+            model=backend.model,
+            seconds=time.perf_counter() - started,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            hedged=hedged,
+        )
+
+    def _hedged(self, messages, primary, threshold, fits):
+        first = self._submit(primary, messages)
+        done, _ = wait([first], timeout=threshold)
+        second_backend = None if done else self.choose(exclude=(primary,), fits=fits)
+        if second_backend is None:
+            return first.result(), primary, False
+
+        self._count("hedges")
+        pending = {first: primary, self._submit(second_backend, messages): second_backend}
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                backend = pending.pop(future)
+                if future.exception() is None:
+                    if backend is second_backend:
+                        self._count("hedge_wins")
+                    return future.result(), backend, True
+                error = future.exception()
+        raise error
+
+    def _submit(self, backend, messages):
+        # Copy the context so the request's spans land in its timing breakdown
+        return self._hedge_pool.submit(contextvars.copy_context().run, backend.complete, messages)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["hedging"] = self.hedge
+        stats["backends"] = {b.name: b.stats() for b in self.backends}
+        return stats
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router(configs: dict) -> LLMRouter:
+    """Shared router over the LLM_ROUTER_BACKENDS entries of `configs`, built on first use"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LLMRouter.from_configs(configs)
+    return _router
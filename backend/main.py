@@ -1,39 +1,111 @@
-from fastapi import FastAPI
-from autogen import Agent, UserProxyAgent, AssistantAgent,ConversableAgent
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import os
+import shutil
 import sys
+import tempfile
+import time
 from dotenv import load_dotenv
-from tavily import TavilyClient
-from typing import Annotated
-from direct_search import direct_web_search
-from coding_gen_test import CodeGen
+from typing import Annotated, List, Optional, Union
+import direct_search
+from direct_search import direct_web_search, get_hedged_search
+from coding_gen_test import CodeGen, llm_config_dict, shared_dir
+from llm_router import get_llm_router
+from search_cache import get_search_cache
+from stats_store import get_stats_store, typed_stats
+from name_resolver import Resolution, canonicalize, get_name_resolver
+from single_flight import SingleFlight
+import stages
+import chart_renderer
+import executor_pool
+import admission
+from admission import ADMISSION_DEGRADE, ChartRejected, get_chart_admission
+from artifact_store import comparison_digest, get_artifact_store, is_digest, stats_digest
+from program_cache import get_program_cache
+from jobs import JobQueue
+import metrics
 
 # Simple Unicode fix without aggressive redirection
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Created here rather than at import; runs live in per-request subdirectories
+    os.makedirs(RUNS_DIR, exist_ok=True)
+    if chart_renderer.NATIVE_RENDER_ENABLED:
+        chart_renderer.warm_up()
+    if executor_pool.EXECUTOR_POOL_WARM_ON_START:
+        # Containers start in the background; the app serves search traffic meanwhile
+        executor_pool.get_executor_pool().warm()
+    # Picks up jobs a previous process left queued or running
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    stages.shutdown()
+    direct_search.shutdown()
+    chart_renderer.shutdown()
+    executor_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Concurrent requests for the same player share one search and one chart run
+_search_flight = SingleFlight()
+_chart_flight = SingleFlight()
+# Chart variants (thumbnails, WebP, SVG) are made once per artifact, by (digest, variant)
+_variant_flight = SingleFlight()
+# Progress callbacks of the requests streaming each in-flight chart, by digest
+_chart_listeners = {}
+# Stale stats being re-searched in the background, by player key
+_background_refreshes = {}
 
-@app.get("/get_stats")
-def get_stats(player_name: str):
 
+BATCH_FAN_OUT = int(os.getenv("BATCH_FAN_OUT", "8"))
+BATCH_MAX_FAN_OUT = int(os.getenv("BATCH_MAX_FAN_OUT", "32"))
+COMPARE_MAX_PLAYERS = int(os.getenv("COMPARE_MAX_PLAYERS", "20"))
+
+RUNS_DIR = os.path.join(shared_dir, "runs")
+CHART_FILENAME = "cricket_stats_chart.png"
+# Stored next to natively rendered charts: their render inputs, so an SVG can be drawn later
+SPEC_EXT = "spec.json"
+# Shared chart runs a request joins after one was refused for another client, before running its own
+CHART_SHARED_RETRIES = 3
+
+
+def _search_and_compact(player_name: str, player_key: str, refresh: bool) -> dict:
     # Get cricket statistics and automatically compact for better parsing
     search = direct_web_search(player_name)  # Fixed: use actual parameter
-    full_results = search.search_stats_tool()  # Get full search results
+    full_results = search.search_stats_tool(refresh=refresh)  # Cached unless refresh=true
     summary = search.compact_search_results(full_results)  # Use compact version
+    # Parsed stats go to the local store so repeat lookups skip the search,
+    # and the player becomes known to name resolution
+    if get_stats_store().put(player_key, summary, player_name=player_name):
+        get_name_resolver().add_player(player_key, player_name)
 
     print("=== COMPACTED SEARCH RESULTS ===")
     print(f"Original size: ~{len(str(full_results))} characters")
     print(f"Compact size: ~{len(str(summary))} characters") 
     print(f"Compression ratio: {len(str(summary))/len(str(full_results))*100:.1f}%")
     print(f"Compact data: {summary}")
+    return summary
+
 
+def _generate_chart(summary: dict, chart_file: str, on_event=None):
+    """Run CodeGen into the chart file's directory; returns the absolute chart path or None"""
     # Execute code generation
     print("[INFO] Starting chart generation...")
     try:
-        code_gen = CodeGen(summary)
-        code_gen.codeExecutor()
+        code_gen = CodeGen(summary, work_dir=os.path.dirname(chart_file), on_event=on_event)
+        with metrics.span("codegen"):
+            code_gen.codeExecutor()
         print("[SUCCESS] Chart generation completed!")
     except UnicodeEncodeError as e:
         print(f"[WARNING] Unicode error caught but continuing: {str(e)}")
@@ -42,39 +114,679 @@ def get_stats(player_name: str):
         # Continue execution even if chart generation fails
 
     # Check if chart was generated (just check file existence)
-    chart_paths = [
-        "./docker_tmp/cricket_stats_chart.png",
-        "docker_tmp/cricket_stats_chart.png", 
-        "../backend/docker_tmp/cricket_stats_chart.png"
-    ]
-    
-    chart_found = False
-    chart_path = None
-    
-    for path in chart_paths:
-        if os.path.exists(path):
-            chart_found = True
-            chart_path = path
-            print(f"[CHART] Chart found at: {chart_path}")
-            break
-    
-    if not chart_found:
-        print("[WARNING] Chart not found in any expected location")
-    
-    # Return simple completion signal (no chart data)
+    if os.path.exists(chart_file):
+        chart_path = os.path.abspath(chart_file)
+        print(f"[CHART] Chart found at: {chart_path}")
+        return chart_path
+    print("[WARNING] Chart not found in expected location")
+    return None
+
+
+async def _produce_chart(summary: dict, player_key: str, digest: str, on_event=None):
+    """Render the chart into the artifact store, natively when the stats parse, else with CodeGen.
+
+    Returns (chart_id or None, renderer name). `on_event(event, **data)` is
+    told about each stage as it starts, possibly from a chart thread.
+    """
+    on_event = on_event or (lambda event, **data: None)
+    store = get_artifact_store()
+    if store.get(digest):
+        return digest, "store"
+
+    # Each run gets its own work dir; only the finished chart leaves it
+    work_dir = tempfile.mkdtemp(prefix="run_", dir=RUNS_DIR)
+    chart_file = os.path.join(work_dir, CHART_FILENAME)
+    try:
+        renderer = None
+        career_stats = chart_renderer.parse_career_stats(summary) if chart_renderer.NATIVE_RENDER_ENABLED else None
+        if career_stats:
+            try:
+                on_event("render_started", renderer="native")
+                player_name = summary.get("player_name", player_key)
+                with metrics.span("native_render"):
+                    await chart_renderer.render_chart_async(career_stats, player_name, chart_file)
+                renderer = "native"
+                await _store_spec(digest, work_dir, {"kind": "player", "stats": career_stats, "player_name": player_name})
+            except Exception as e:
+                print(f"[ERROR] Native chart render failed, falling back to CodeGen: {str(e)}")
+
+        if renderer is None:
+            # Only CodeGen runs are gated: the client's run budget and the queue bound are checked here,
+            # so stored and natively rendered charts never touch either. Raises ChartRejected for the
+            # client that started the run; _chart_for retries the requests that merely shared it
+            with get_chart_admission().admit(admission.current_client.get()):
+                on_event("render_started", renderer="codegen")
+                await stages.run_chart(_generate_chart, summary, chart_file, on_event)
+            renderer = "codegen"
+
+        if not os.path.exists(chart_file):
+            return None, renderer
+        with metrics.span("chart_store_put"):
+            stored_path = await asyncio.to_thread(store.put, digest, chart_file)
+        print(f"[CHART] {renderer} chart stored at: {stored_path}")
+        return digest, renderer
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def _store_spec(digest: str, work_dir: str, spec: dict):
+    """Best effort: without a spec the chart only lacks its SVG variant"""
+    spec_file = os.path.join(work_dir, SPEC_EXT)
+    try:
+        with open(spec_file, "w", encoding="utf-8") as f:
+            json.dump(spec, f)
+        await asyncio.to_thread(get_artifact_store().put, digest, spec_file, SPEC_EXT)
+    except Exception as e:
+        print(f"[WARNING] Could not store the render spec of chart {digest}: {str(e)}")
+
+
+def _chart_urls(chart_id: Optional[str]) -> dict:
+    return {"chart_url": f"/charts/{chart_id}" if chart_id else None,
+            "chart_thumbnail_url": f"/charts/{chart_id}?variant=thumb" if chart_id else None}
+
+
+async def _search_stage(player_name: str, player_key: str, refresh: bool):
+    """Search stage, coalesced per player. Returns (summary, shared)"""
+    with metrics.span("search_stage"):
+        return await _search_flight.do(
+            player_key, lambda: stages.run_search(_search_and_compact, player_name, player_key, refresh)
+        )
+
+
+def _refresh_in_background(player_name: str, player_key: str):
+    """Re-search a stale player off the request path; the result lands in the stats store"""
+    if player_key in _background_refreshes:
+        return
+
+    async def refresh():
+        try:
+            await _search_stage(player_name, player_key, True)
+        except Exception as e:
+            print(f"[WARNING] Background refresh failed for {player_name}: {str(e)}")
+        finally:
+            _background_refreshes.pop(player_key, None)
+
+    _background_refreshes[player_key] = asyncio.ensure_future(refresh())
+
+
+async def _lookup_stats(player_name: str, player_key: str, refresh: bool = False):
+    """Stats for a player, from the local store when young enough, else the search stage. Returns (summary, shared)"""
+    if not refresh:
+        with metrics.span("stats_store_lookup"):
+            stored = get_stats_store().get(player_key)
+        if stored is not None and stored.usable:
+            if not stored.fresh:
+                _refresh_in_background(player_name, player_key)
+            return stored.summary, False
+    return await _search_stage(player_name, player_key, refresh)
+
+
+def _chart_progress(digest: str):
+    """Progress callback for a chart run that fans out to every request waiting on it"""
+    def emit(event, **data):
+        # Snapshot the list; listeners come and go on the event loop thread
+        for listener in list(_chart_listeners.get(digest, ())):
+            listener(event, **data)
+    return emit
+
+
+async def _chart_for(summary: dict, player_key: str, on_event=None):
+    """Chart stage, coalesced per stats digest. Returns (chart_id, renderer, shared)"""
+    # Keyed by content, so identical stats share one render and one artifact
+    digest = stats_digest(player_key, summary)
+    if on_event is not None:
+        _chart_listeners.setdefault(digest, []).append(on_event)
+    client = admission.current_client.get()
+    try:
+        with metrics.span("chart_stage"):
+            for _ in range(CHART_SHARED_RETRIES):
+                try:
+                    (chart_id, renderer), shared = await _chart_flight.do(
+                        digest, lambda: _produce_chart(summary, player_key, digest, _chart_progress(digest))
+                    )
+                    break
+                except ChartRejected as e:
+                    if e.client == client:
+                        raise
+                    # Refused for whoever started the shared run, not for this caller: ask again as
+                    # (or alongside) a run admitted on this caller's own budget
+            else:
+                (chart_id, renderer), shared = await _produce_chart(summary, player_key, digest, on_event), False
+    finally:
+        if on_event is not None:
+            listeners = _chart_listeners.get(digest, [])
+            listeners.remove(on_event)
+            if not listeners:
+                _chart_listeners.pop(digest, None)
+    return chart_id, renderer, shared
+
+
+def _chart_shed(e: ChartRejected) -> dict:
+    """Response fields for a chart left out by admission control; raises instead when not degrading"""
+    if not ADMISSION_DEGRADE:
+        raise HTTPException(status_code=e.status, detail=str(e), headers=e.headers())
+    return {"degraded": True, "chart_status": e.reason, "retry_after": e.retry_after}
+
+
+def _resolve_player(player_name: str, exact: bool = False) -> Resolution:
+    """Canonical name and key for a requested player; exact=true searches the name as typed"""
+    if exact:
+        return Resolution(player_name, canonicalize(player_name), player_name, "as_typed")
+    return get_name_resolver().resolve(player_name)
+
+
+def _ambiguous_detail(resolution: Resolution) -> dict:
     return {
+        "message": f"'{resolution.query}' matches more than one known player; pick one or pass exact=true",
+        "query": resolution.query,
+        "candidates": resolution.candidates,
+    }
+
+
+def _resolve_or_raise(player_name: str, exact: bool = False) -> Resolution:
+    resolution = _resolve_player(player_name, exact)
+    if resolution.ambiguous:
+        raise HTTPException(status_code=300, detail=_ambiguous_detail(resolution))
+    if not resolution.player_key:
+        raise HTTPException(status_code=422, detail="player_name must not be empty")
+    return resolution
+
+
+@app.get("/get_stats")
+async def get_stats(http_response: Response, player_name: str, refresh: bool = False, chart: bool = True,
+                    timings: bool = False, exact: bool = False):
+    query = player_name
+    # Name variants resolve to one known player, so they share cached stats and charts
+    resolution = _resolve_or_raise(player_name, exact)
+    player_name, player_key = resolution.player_name, resolution.player_key
+    # timings=true adds a per-stage breakdown of this request to the response
+    shed = None
+    with metrics.request_timer(enabled=timings) as timer:
+        summary, search_shared = await _lookup_stats(player_name, player_key, refresh)
+
+        chart_id, renderer, chart_shared = None, None, False
+        if chart:
+            try:
+                chart_id, renderer, chart_shared = await _chart_for(summary, player_key)
+            except ChartRejected as e:
+                # Under pressure the stats still go out; the chart can be asked for again later
+                shed = _chart_shed(e)
+                http_response.headers.update(e.headers())
+
+    coalesced = search_shared or chart_shared
+    if coalesced:
+        print(f"[INFO] Served {player_name} from a shared in-flight run")
+
+    chart_found = chart_id is not None
+    if not chart:
+        message = f"Statistics retrieved for {player_name}"
+    elif shed:
+        busy = "chart generation is busy" if shed["chart_status"] == "shed" else "chart generation is rate limited"
+        message = f"Statistics retrieved for {player_name}; {busy}, retry in {shed['retry_after']}s"
+    elif chart_found:
+        message = f"Chart generation completed for {player_name}"
+    else:
+        message = f"Chart generation failed for {player_name}"
+
+    # Return simple completion signal (no chart data)
+    response = {
         "execution_completed": True,
         "player_name": player_name,
+        "query": query,
+        "name_resolution": resolution.method,
         "chart_generated": chart_found,
-        "chart_path": chart_path,
+        "chart_id": chart_id,
+        **_chart_urls(chart_id),
+        "chart_path": os.path.abspath(get_artifact_store().path_for(chart_id)) if chart_found else None,
+        "chart_renderer": renderer,
+        "statistics": summary,
+        "coalesced": coalesced,
+        "message": message
+    }
+    if shed:
+        response.update(shed)
+    if timer is not None:
+        response["timings"] = timer.breakdown()
+    return response
+
+
+@app.get("/get_stats/stream")
+async def get_stats_stream(player_name: str, refresh: bool = False, chart: bool = True, exact: bool = False):
+    """Same pipeline as /get_stats, streamed as NDJSON events so the stats arrive before the chart.
+
+    Events: search_started, search_done (with statistics), render_started,
+    code_generated, sandbox_running, sandbox_finished, then chart_ready (with
+    chart_url), chart_failed or chart_shed (CodeGen saturated, with
+    retry_after), and finally done. Failures produce an error event, and
+    names matching several players an ambiguous event (with candidates),
+    followed by done.
+    """
+    resolution = _resolve_player(player_name, exact)
+    player_name, player_key = resolution.player_name or player_name, resolution.player_key
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    started = time.perf_counter()
+
+    def on_event(event, **data):
+        # Chart stages report from worker threads; hop onto the loop to enqueue
+        item = {"event": event, **data, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        loop.call_soon_threadsafe(events.put_nowait, item)
+
+    async def pipeline():
+        try:
+            if resolution.ambiguous:
+                on_event("ambiguous", **_ambiguous_detail(resolution))
+                return
+            if not player_key:
+                # Same check as /get_stats (422 there): nothing searchable is left of the name
+                on_event("error", message="player_name must not be empty")
+                return
+            on_event("search_started", player_name=player_name, query=resolution.query,
+                     name_resolution=resolution.method)
+            summary, search_shared = await _lookup_stats(player_name, player_key, refresh)
+            on_event("search_done", player_name=player_name, statistics=summary, coalesced=search_shared)
+            if chart:
+                try:
+                    chart_id, renderer, chart_shared = await _chart_for(summary, player_key, on_event=on_event)
+                except ChartRejected as e:
+                    on_event("chart_shed", reason=e.reason, retry_after=e.retry_after, message=str(e))
+                    return
+                if chart_id is not None:
+                    on_event("chart_ready", chart_id=chart_id, **_chart_urls(chart_id),
+                             chart_path=os.path.abspath(get_artifact_store().path_for(chart_id)),
+                             chart_renderer=renderer, coalesced=chart_shared)
+                else:
+                    on_event("chart_failed", chart_renderer=renderer,
+                             message=f"Chart generation failed for {player_name}")
+        except Exception as e:
+            print(f"[ERROR] Streaming lookup failed for {player_name}: {str(e)}")
+            on_event("error", message=str(e))
+        finally:
+            on_event("done", player_name=player_name)
+
+    async def stream():
+        task = asyncio.ensure_future(pipeline())
+        try:
+            while True:
+                event = await events.get()
+                yield json.dumps(event) + "\n"
+                if event["event"] == "done":
+                    break
+        finally:
+            # Client went away: stop waiting, the shared runs carry on for other requests
+            task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+async def _run_job(job: dict, on_event) -> dict:
+    """Job runner: the get_stats pipeline for one queued job, reporting stages to on_event"""
+    summary, _ = await _lookup_stats(job["player_name"], job["player_key"], job["refresh"])
+    on_event("search_done", statistics=summary)
+    chart_id, renderer = None, None
+    if job["chart"]:
+        # Jobs carry no client, so they are never shed, even when a shared run they joined was
+        chart_id, renderer, _ = await _chart_for(summary, job["player_key"], on_event=on_event)
+    return {
+        "player_name": job["player_name"],
+        "chart_generated": chart_id is not None,
+        "chart_id": chart_id,
+        **_chart_urls(chart_id),
+        "chart_renderer": renderer,
         "statistics": summary,
-        "message": f"Chart generation completed for {player_name}" if chart_found else f"Chart generation failed for {player_name}"
     }
 
-    
+
+def _job_result_reusable(result: dict) -> bool:
+    # Charts can be evicted from the store after the job finished
+    return not result.get("chart_id") or get_artifact_store().get(result["chart_id"]) is not None
+
+
+job_queue = JobQueue(_run_job, reusable=_job_result_reusable)
+
+
+class JobRequest(BaseModel):
+    player_name: str
+    chart: bool = True
+    refresh: bool = False
+    exact: bool = False
+
+
+def _job_links(job_id: str) -> dict:
+    return {"status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """Queue a stats (and chart) job and return its id right away"""
+    resolution = _resolve_or_raise(request.player_name, request.exact)
+    job, reused = await job_queue.submit(resolution.player_name, resolution.player_key, request.chart, request.refresh)
+    return {"job_id": job["id"], "status": job["status"], "reused": reused, **_job_links(job["id"])}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Poll a job: status, current stage while running, and the result once it succeeded"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {**job, **_job_links(job_id)}
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Subscribe to a job: its current state, then NDJSON progress events until it finishes"""
+    if await asyncio.to_thread(job_queue.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for event in job_queue.subscribe(job_id):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+class BatchPlayer(BaseModel):
+    name: str
+    chart: bool = False
+
+
+class BatchStatsRequest(BaseModel):
+    # Plain names are search-only; use {"name": ..., "chart": true} to also render a chart
+    players: List[Union[str, BatchPlayer]]
+    fan_out: Optional[int] = None
+    refresh: bool = False
+    exact: bool = False
+
+
+async def _batch_item(player_name: str, player_key: str, chart: bool, refresh: bool, fan_out: asyncio.Semaphore) -> dict:
+    started = time.perf_counter()
+    try:
+        async with fan_out:
+            summary, _ = await _lookup_stats(player_name, player_key, refresh)
+        item = {"type": "player", "status": "ok", "player_name": player_name, "statistics": summary}
+        if chart:
+            try:
+                chart_id, renderer, _ = await _chart_for(summary, player_key)
+            except ChartRejected as e:
+                chart_id, renderer = None, None
+                item.update({"chart_status": e.reason, "retry_after": e.retry_after})
+            item.update({"chart_generated": chart_id is not None, "chart_id": chart_id, **_chart_urls(chart_id),
+                         "chart_renderer": renderer})
+    except Exception as e:
+        print(f"[ERROR] Batch lookup failed for {player_name}: {str(e)}")
+        item = {"type": "player", "status": "error", "player_name": player_name, "error": str(e)}
+    item["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return item
+
+
+@app.post("/get_stats/batch")
+async def get_stats_batch(request: BatchStatsRequest):
+    """Stats for many players, streamed back as NDJSON lines in completion order"""
+    # Dedupe on the resolved player; a player is charted if any of its entries asks for it
+    wanted = {}
+    ambiguous = []
+    for entry in request.players:
+        player = BatchPlayer(name=entry) if isinstance(entry, str) else entry
+        resolution = _resolve_player(player.name, request.exact)
+        if resolution.ambiguous:
+            ambiguous.append({"type": "player", "status": "ambiguous", "player_name": player.name,
+                              "candidates": resolution.candidates})
+            continue
+        player_key = resolution.player_key
+        if not player_key:
+            continue
+        if player_key in wanted:
+            wanted[player_key]["chart"] = wanted[player_key]["chart"] or player.chart
+        else:
+            wanted[player_key] = {"name": resolution.player_name, "chart": player.chart}
+
+    fan_out = min(request.fan_out or BATCH_FAN_OUT, BATCH_MAX_FAN_OUT)
+    semaphore = asyncio.Semaphore(max(fan_out, 1))
+
+    async def stream():
+        started = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(_batch_item(p["name"], key, p["chart"], request.refresh, semaphore))
+            for key, p in wanted.items()
+        ]
+        errors = 0
+        for item in ambiguous:
+            yield json.dumps(item) + "\n"
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                errors += item["status"] == "error"
+                yield json.dumps(item) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield json.dumps({
+            "type": "summary",
+            "requested": len(request.players),
+            "unique_players": len(wanted),
+            "ambiguous": len(ambiguous),
+            "errors": errors,
+            "fan_out": fan_out,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+class CompareRequest(BaseModel):
+    players: List[str]
+    refresh: bool = False
+    exact: bool = False
+    chart: bool = True
+
+
+async def _produce_comparison_chart(player_names: list, panels: list, digest: str):
+    """Render a comparison chart into the artifact store; returns the chart id or None"""
+    store = get_artifact_store()
+    if store.get(digest):
+        return digest
+    work_dir = tempfile.mkdtemp(prefix="compare_", dir=RUNS_DIR)
+    chart_file = os.path.join(work_dir, CHART_FILENAME)
+    try:
+        with metrics.span("compare_render"):
+            await chart_renderer.render_comparison_chart_async(player_names, panels, chart_file)
+        await _store_spec(digest, work_dir, {"kind": "comparison", "player_names": player_names, "panels": panels})
+        with metrics.span("chart_store_put"):
+            stored_path = await asyncio.to_thread(store.put, digest, chart_file)
+        print(f"[CHART] Comparison chart stored at: {stored_path}")
+        return digest
+    except Exception as e:
+        print(f"[ERROR] Comparison chart render failed: {str(e)}")
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@app.post("/compare")
+async def compare_players(request: CompareRequest):
+    """Side-by-side career stats of 2..COMPARE_MAX_PLAYERS players with one grouped chart.
+
+    Uses the parsed stats only: no CodeGen run, whatever the player count.
+    """
+    # numpy is only needed here; keep it out of startup
+    import comparison
+
+    started = time.perf_counter()
+    wanted = {}
+    ambiguous = []
+    for name in request.players:
+        resolution = _resolve_player(name, request.exact)
+        if resolution.ambiguous:
+            ambiguous.append({"player_name": name, "candidates": resolution.candidates})
+        elif resolution.player_key:
+            wanted.setdefault(resolution.player_key, resolution.player_name)
+    if ambiguous:
+        raise HTTPException(status_code=300, detail={
+            "message": "Some names match more than one known player; pick one or pass exact=true",
+            "ambiguous": ambiguous,
+        })
+    if not 2 <= len(wanted) <= COMPARE_MAX_PLAYERS:
+        raise HTTPException(status_code=422,
+                            detail=f"Compare needs 2 to {COMPARE_MAX_PLAYERS} distinct players, got {len(wanted)}")
+
+    semaphore = asyncio.Semaphore(max(BATCH_FAN_OUT, 1))
+
+    async def lookup(player_key, player_name):
+        async with semaphore:
+            summary, _ = await _lookup_stats(player_name, player_key, request.refresh)
+        return summary
+
+    results = await asyncio.gather(*(lookup(key, name) for key, name in wanted.items()), return_exceptions=True)
+    entries, missing = [], []
+    for (player_key, player_name), summary in zip(wanted.items(), results):
+        if isinstance(summary, Exception):
+            print(f"[ERROR] Compare lookup failed for {player_name}: {str(summary)}")
+            missing.append({"player_name": player_name, "reason": str(summary)})
+        elif not typed_stats(summary):
+            missing.append({"player_name": player_name, "reason": "no parsed career stats"})
+        else:
+            entries.append((player_key, player_name, summary))
+    if len(entries) < 2:
+        raise HTTPException(status_code=422, detail={
+            "message": "Fewer than 2 of the players have parsed career stats to compare",
+            "missing": missing,
+        })
+
+    with metrics.span("compare_matrix"):
+        result = comparison.compare(comparison.build_matrix(entries))
+        response = comparison.comparison_summary(result)
+
+    chart_id = None
+    if request.chart:
+        # Keyed by the players' stats in a fixed order, so the same comparison is rendered once
+        digest = comparison_digest(sorted(((key, summary) for key, _, summary in entries), key=lambda e: e[0]))
+        player_names, panels = comparison.chart_data(result)
+        chart_id, _ = await _chart_flight.do(digest, lambda: _produce_comparison_chart(player_names, panels, digest))
+
+    response.update({
+        "missing": missing,
+        "chart_generated": chart_id is not None,
+        "chart_id": chart_id,
+        **_chart_urls(chart_id),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+    return response
+
+
+async def _produce_variant(chart_id: str, variant: str, ext: str) -> Optional[str]:
+    """Make one variant of a stored chart and store it next to the original; None if it can't be made"""
+    store = get_artifact_store()
+    work_dir = tempfile.mkdtemp(prefix="variant_", dir=RUNS_DIR)
+    output_file = os.path.join(work_dir, f"chart.{ext}")
+    try:
+        with metrics.span("chart_variant", variant=variant):
+            if variant == "svg":
+                spec_path = store.get(chart_id, SPEC_EXT)
+                if spec_path is None:
+                    return None
+                with open(spec_path, encoding="utf-8") as f:
+                    spec = json.load(f)
+                await chart_renderer.render_svg_async(spec, output_file)
+            else:
+                src_path = store.get(chart_id)
+                if src_path is None:
+                    return None
+                await chart_renderer.render_variant_async(src_path, variant, output_file)
+        return await asyncio.to_thread(store.put, chart_id, output_file, ext)
+    except Exception as e:
+        print(f"[ERROR] Could not make the {variant} variant of chart {chart_id}: {str(e)}")
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@app.get("/charts/{chart_id}")
+async def get_chart(chart_id: str, variant: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    """Serve a stored chart. Content-addressed, so it can be cached forever.
+
+    `variant` picks a smaller rendition: thumb (320px WebP), medium (800px
+    WebP), webp, png (optimized) or svg (native charts only). Each is made
+    on first request and stored with the chart.
+    """
+    if not is_digest(chart_id):
+        raise HTTPException(status_code=404, detail="Chart not found")
+    store = get_artifact_store()
+    if variant in (None, "", "original"):
+        path = await asyncio.to_thread(store.get, chart_id)
+        etag, media_type = f'"{chart_id}"', "image/png"
+    else:
+        if variant not in chart_renderer.CHART_VARIANTS:
+            raise HTTPException(status_code=422, detail=f"variant must be one of: original, "
+                                                        f"{', '.join(chart_renderer.CHART_VARIANTS)}")
+        fmt, _ = chart_renderer.CHART_VARIANTS[variant]
+        ext = f"{variant}.{fmt}"
+        etag, media_type = f'"{chart_id}.{variant}"', chart_renderer.MEDIA_TYPES[fmt]
+        path = await asyncio.to_thread(store.get, chart_id, ext)
+        if path is None:
+            path, _ = await _variant_flight.do((chart_id, variant), lambda: _produce_variant(chart_id, variant, ext))
+    if path is None:
+        detail = "SVG is only available for natively rendered charts" if variant == "svg" else "Chart not found"
+        raise HTTPException(status_code=404, detail=detail)
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+class AliasRequest(BaseModel):
+    alias: str
+    player_name: str
+
+
+@app.get("/players/resolve")
+def resolve_player(name: str):
+    """How a name resolves: the canonical player it maps to, or the candidates if ambiguous"""
+    resolution = get_name_resolver().resolve(name)
+    return {"query": resolution.query, "player_key": resolution.player_key, "player_name": resolution.player_name,
+            "method": resolution.method, "candidates": resolution.candidates}
 
 
+@app.post("/players/aliases")
+def add_player_alias(request: AliasRequest):
+    """Map an alias (nickname, short form) to a known player"""
+    resolution = get_name_resolver().resolve(request.player_name)
+    if resolution.method not in ("exact", "alias"):
+        raise HTTPException(status_code=404, detail=f"No known player named '{request.player_name}'")
+    get_name_resolver().add_alias(request.alias, resolution.player_key)
+    return {"alias": canonicalize(request.alias), "player_key": resolution.player_key,
+            "player_name": resolution.player_name}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latency histograms, token/byte counters and component stats in Prometheus text format"""
+    body = metrics.render_prometheus({
+        "cricket_search_cache": get_search_cache().stats(),
+        "cricket_search": get_hedged_search().stats(),
+        "cricket_executor_pool": executor_pool.get_executor_pool().stats(),
+        "cricket_chart_store": get_artifact_store().stats(),
+        "cricket_program_cache": get_program_cache().stats(),
+        "cricket_stats_store": get_stats_store().stats(),
+        "cricket_name_resolver": get_name_resolver().stats(),
+        "cricket_jobs": job_queue.stats(),
+        "cricket_llm_router": get_llm_router(llm_config_dict).stats(),
+        "cricket_chart_admission": get_chart_admission().stats(),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
 
 
+@app.get("/cache_stats")
+def cache_stats():
+    """Hit/miss counters and sizes for the caches, stores and worker pools, and LLM routing"""
+    return {"search_cache": get_search_cache().stats(),
+            "search": get_hedged_search().stats(),
+            "executor_pool": executor_pool.get_executor_pool().stats(),
+            "chart_store": get_artifact_store().stats(),
+            "program_cache": get_program_cache().stats(),
+            "stats_store": get_stats_store().stats(),
+            "name_resolver": get_name_resolver().stats(),
+            "jobs": job_queue.stats(),
+            "llm_router": get_llm_router(llm_config_dict).stats(),
+            "chart_admission": get_chart_admission().stats()}
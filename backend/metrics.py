@@ -0,0 +1,215 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# Seconds; spans range from parsing (ms) to a full CodeGen run (up to DOCKER_TIMEOUT)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter():
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(key)} {_number(value)}")
+        return lines
+
+
+class Histogram():
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_text(key, (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(key, (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(key)} {series[-1]}")
+        return lines
+
+
+stage_seconds = Histogram("cricket_stage_duration_seconds", "Time spent in each pipeline stage")
+http_seconds = Histogram("cricket_http_request_duration_seconds", "HTTP request latency by handler")
+http_requests = Counter("cricket_http_requests_total", "HTTP requests by handler and status")
+llm_tokens = Counter("cricket_llm_tokens_total", "LLM tokens used by CodeGen chats")
+llm_requests = Counter("cricket_llm_requests_total", "LLM requests by routed backend and outcome")
+admission_decisions = Counter("cricket_chart_admission_total", "CodeGen chart runs admitted, shed or rate limited")
+bytes_total = Counter("cricket_bytes_total", "Bytes received from upstreams and sent to clients")
+prompt_tokens = Histogram("cricket_codegen_prompt_tokens", "Tokens in the first prompt of a CodeGen chat",
+                          buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000))
+
+_REGISTRY = (stage_seconds, http_seconds, http_requests, llm_tokens, llm_requests, admission_decisions, bytes_total,
+             prompt_tokens)
+
+
+class RequestTimer():
+    """Spans recorded on behalf of one request, for its timing breakdown"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name: str, started: float, seconds: float, **labels):
+        # list.append is atomic, spans may come from several threads at once
+        self.spans.append({"name": name, "start_ms": round((started - self.started) * 1000, 2),
+                           "ms": round(seconds * 1000, 2), **labels})
+
+    def breakdown(self) -> dict:
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "spans": sorted(self.spans, key=lambda s: s["start_ms"])}
+
+
+# Timer of the current request when a timing breakdown was asked for. It is
+# shared with the threads and tasks the request fans out to, since they run
+# in copies of its context.
+_request_timer: contextvars.ContextVar[Optional[RequestTimer]] = contextvars.ContextVar("request_timer", default=None)
+
+
+def record_span(name: str, seconds: float, **labels):
+    """Record a finished span: always into the histogram, and into the request breakdown if one is active"""
+    stage_seconds.observe(seconds, stage=name)
+    timer = _request_timer.get()
+    if timer is not None:
+        timer.add(name, time.perf_counter() - seconds, seconds, **labels)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block as pipeline stage `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started, **labels)
+
+
+@contextmanager
+def request_timer(enabled: bool = True):
+    """Collect the spans of this request (and the work it starts) into a RequestTimer"""
+    if not enabled:
+        yield None
+        return
+    timer = RequestTimer()
+    token = _request_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _request_timer.reset(token)
+
+
+def count_bytes(source: str, direction: str, amount: int):
+    if amount:
+        bytes_total.inc(amount, source=source, direction=direction)
+
+
+def count_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, model=model, kind="completion")
+
+
+def _stats_lines(prefix: str, stats: dict) -> list:
+    """Export a component's stats() dict as gauges, e.g. cricket_search_cache_hits"""
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_number(value)}")
+    return lines
+
+
+def render_prometheus(component_stats: Optional[Dict[str, dict]] = None) -> str:
+    """Prometheus text exposition of all metrics, plus gauges for each component's stats()"""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for prefix, stats in (component_stats or {}).items():
+        lines.extend(_stats_lines(prefix, stats))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware():
+    """ASGI middleware recording latency, status and body bytes in/out per handler"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        state = {"status": 500, "in": 0, "out": 0}
+
+        async def counting_receive():
+            message = await receive()
+            state["in"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["out"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            http_seconds.observe(time.perf_counter() - started, handler=handler)
+            http_requests.inc(handler=handler, status=str(state["status"]))
+            count_bytes(f"http:{handler}", "in", state["in"])
+            count_bytes(f"http:{handler}", "out", state["out"])
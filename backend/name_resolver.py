@@ -0,0 +1,222 @@
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from search_cache import normalize_player_name
+from stats_store import get_stats_store
+
+load_dotenv()
+
+NAME_ALIAS_PATH = os.getenv("NAME_ALIAS_PATH", "./player_aliases.sqlite3")
+# A fuzzy match may differ by at most this many edits per character of the name
+NAME_MAX_EDIT_RATIO = float(os.getenv("NAME_MAX_EDIT_RATIO", "0.2"))
+MAX_CANDIDATES = 8
+MAX_MEMO_ENTRIES = 10000
+
+# "A.B." and "O'Brien" join up; other punctuation separates words
+_JOINING = re.compile(r"[.'\u2019]")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def canonicalize(name: str) -> str:
+    """Lowercase ASCII key: accents folded, dots and apostrophes dropped, other punctuation to spaces"""
+    folded = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return normalize_player_name(_PUNCTUATION.sub(" ", _JOINING.sub("", folded)))
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _same_initials(a: str, b: str) -> bool:
+    """Typos rarely hit the first letter of a name; "Rohit" vs "Mohit" is another player"""
+    a_tokens, b_tokens = a.split(), b.split()
+    return len(a_tokens) == len(b_tokens) and all(x[0] == y[0] for x, y in zip(a_tokens, b_tokens))
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 as soon as it must exceed `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+@dataclass
+class Resolution:
+    query: str
+    player_key: Optional[str]
+    player_name: Optional[str]
+    # "exact", "alias", "initials", "surname", "fuzzy", "new", "ambiguous" or "as_typed"
+    method: str
+    candidates: List[dict] = field(default_factory=list)
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.method == "ambiguous"
+
+
+class NameResolver():
+    """Maps name variants ("Kohli", "V Kohli", "virat  kohli", "Virat Kohl") to one known player key.
+
+    Known players are the ones with stored stats. Lookups try, in order: the
+    canonical key, the alias table, initials + surname, surname alone, then a
+    trigram index with a bounded edit distance. Several equally good matches
+    (or known players sharing a surname) make the name ambiguous; no match
+    means a new player, searched as typed.
+    Aliases added by hand are persisted; resolutions are memoized until the
+    set of known players changes.
+    """
+
+    def __init__(self, path=NAME_ALIAS_PATH, max_edit_ratio=NAME_MAX_EDIT_RATIO):
+        self.max_edit_ratio = max_edit_ratio
+        self._lock = threading.Lock()
+        self._players = {}  # key -> display name
+        self._aliases = {}  # alias key -> player key
+        self._by_trigram = defaultdict(set)
+        self._by_surname = defaultdict(set)
+        self._memo = {}  # canonical query -> Resolution
+        self._counters = {"lookups": 0, "memo_hits": 0, "exact": 0, "alias": 0, "initials": 0,
+                          "surname": 0, "fuzzy": 0, "new": 0, "ambiguous": 0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS player_aliases (alias TEXT PRIMARY KEY, player_key TEXT NOT NULL)"
+        )
+        self._db.commit()
+        for alias, player_key in self._db.execute("SELECT alias, player_key FROM player_aliases"):
+            self._aliases[alias] = player_key
+
+    def add_player(self, player_key: str, player_name: str):
+        with self._lock:
+            if player_key in self._players:
+                return
+            self._players[player_key] = player_name
+            for gram in _trigrams(player_key):
+                self._by_trigram[gram].add(player_key)
+            self._by_surname[player_key.split()[-1]].add(player_key)
+            # A new player can turn an earlier unique match into an ambiguous one
+            self._memo.clear()
+
+    def add_alias(self, alias: str, player_key: str):
+        alias_key = canonicalize(alias)
+        with self._lock:
+            self._aliases[alias_key] = player_key
+            self._db.execute("INSERT OR REPLACE INTO player_aliases (alias, player_key) VALUES (?, ?)",
+                             (alias_key, player_key))
+            self._db.commit()
+            self._memo.clear()
+
+    def resolve(self, name: str) -> Resolution:
+        key = canonicalize(name)
+        with self._lock:
+            self._counters["lookups"] += 1
+            memo = self._memo.get(key)
+            if memo is not None:
+                self._counters["memo_hits"] += 1
+                return Resolution(name, memo.player_key, memo.player_name, memo.method, memo.candidates)
+            resolution = self._resolve(name, key)
+            self._counters[resolution.method] += 1
+            if len(self._memo) >= MAX_MEMO_ENTRIES:
+                self._memo.clear()
+            self._memo[key] = resolution
+            return resolution
+
+    def _resolve(self, name: str, key: str) -> Resolution:
+        # caller holds self._lock
+        if not key:
+            return Resolution(name, None, None, "new")
+        if key in self._players:
+            return self._match(name, key, "exact")
+        if key in self._aliases:
+            return self._match(name, self._aliases[key], "alias")
+
+        tokens = key.split()
+        if len(tokens) > 1 and all(len(t) <= 2 for t in tokens[:-1]):
+            initials = "".join(tokens[:-1])
+            matches = [k for k in self._by_surname.get(tokens[-1], ())
+                       if "".join(t[0] for t in k.split()[:-1]).startswith(initials)]
+            if matches:
+                return self._pick(name, matches, "initials")
+        if len(tokens) == 1 and tokens[0] in self._by_surname:
+            return self._pick(name, list(self._by_surname[tokens[0]]), "surname")
+
+        return self._fuzzy(name, key)
+
+    def _fuzzy(self, name: str, key: str) -> Resolution:
+        query_grams = _trigrams(key)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for candidate in self._by_trigram.get(gram, ()):
+                shared[candidate] += 1
+        limit = max(1, int(len(key) * self.max_edit_ratio))
+        scored = []
+        for candidate, overlap in sorted(shared.items(), key=lambda item: -item[1])[:MAX_CANDIDATES * 2]:
+            similarity = overlap / len(query_grams | _trigrams(candidate))
+            if similarity < 0.3:
+                continue
+            distance = edit_distance(key, candidate, limit)
+            if distance <= limit:
+                scored.append((distance, candidate))
+        if not scored:
+            return Resolution(name, key, name, "new")
+        best = min(distance for distance, _ in scored)
+        closest = [candidate for distance, candidate in scored if distance == best]
+        if not any(_same_initials(key, candidate) for candidate in closest):
+            tokens = key.split()
+            if len(tokens) > 1 and len(tokens[0]) > 2:
+                # A full first name typed with another first letter ("Mohit Sharma") is another player
+                return Resolution(name, key, name, "new")
+            # Close, but plausibly a different player: offer, don't assume
+            return self._ambiguous(name, closest)
+        return self._pick(name, [c for c in closest if _same_initials(key, c)], "fuzzy")
+
+    def _pick(self, name: str, matches: list, method: str) -> Resolution:
+        if len(matches) == 1:
+            return self._match(name, matches[0], method)
+        return self._ambiguous(name, matches)
+
+    def _ambiguous(self, name: str, matches: list) -> Resolution:
+        candidates = [{"player_key": k, "player_name": self._players[k]} for k in sorted(matches)[:MAX_CANDIDATES]]
+        return Resolution(name, None, None, "ambiguous", candidates)
+
+    def _match(self, name: str, player_key: str, method: str) -> Resolution:
+        return Resolution(name, player_key, self._players.get(player_key, name), method)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({"players": len(self._players), "aliases": len(self._aliases), "memo_entries": len(self._memo)})
+        return stats
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_name_resolver() -> NameResolver:
+    """Shared resolver, seeded with every player in the stats store on first use"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                resolver = NameResolver()
+                for player_key, player_name in get_stats_store().players():
+                    resolver.add_player(player_key, player_name)
+                _resolver = resolver
+    return _resolver
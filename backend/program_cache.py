@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROGRAM_CACHE_DIR = os.getenv("PROGRAM_CACHE_DIR", "./program_cache")
+PROGRAM_CACHE_ENABLED = os.getenv("PROGRAM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Generated programs must read their data from this file to be replayable
+DATA_FILENAME = "stats_data.json"
+
+FORMATS = ("Test", "ODI", "T20I")
+FIELDS = (("matches", r'\bmatches\b'), ("runs", r'\bruns\b'), ("avg", r'\bav(?:g|erage)\b'),
+          ("centuries", r'\bcenturies\b'))
+_FIELD_PATTERNS = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in FIELDS]
+
+
+def summary_shape(summary) -> dict:
+    """Normalized shape of a summary: which keys, formats and fields are present, not their values"""
+    if not isinstance(summary, dict):
+        return {"type": type(summary).__name__}
+    results = summary.get("results") if isinstance(summary.get("results"), list) else []
+    content = " ".join(str(r.get("content", "")) for r in results if isinstance(r, dict))
+    return {
+        "keys": sorted(summary.keys()),
+        "result_keys": sorted({k for r in results if isinstance(r, dict) for k in r.keys()}),
+        "results": min(len(results), 3),
+        "career_statistics": content.startswith("Career statistics:"),
+        "formats": [fmt for fmt in FORMATS if re.search(rf'\b{fmt}\b', content)],
+        "fields": [name for name, pattern in _FIELD_PATTERNS if pattern.search(content)],
+    }
+
+
+def shape_key(summary) -> str:
+    canonical = json.dumps(summary_shape(summary), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def is_replayable(code_blocks) -> bool:
+    """Only programs that load DATA_FILENAME can be re-run against new stats"""
+    return bool(code_blocks) and any(DATA_FILENAME in block["code"] for block in code_blocks)
+
+
+class ProgramCache():
+    """Successful LLM-generated plotting programs, keyed by the shape of the summary they plotted.
+
+    Entries are kept in memory and persisted as one JSON file per shape. A
+    program that fails on replay is dropped, so the next miss regenerates it.
+    """
+
+    def __init__(self, root=PROGRAM_CACHE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._programs = {}
+        self._counters = {"lookups": 0, "hits": 0, "misses": 0, "replay_failures": 0,
+                          "stored": 0, "llm_calls": 0, "llm_calls_saved": 0, "tokens_saved": 0}
+        os.makedirs(root, exist_ok=True)
+        for name in os.listdir(root):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(root, name), encoding="utf-8") as f:
+                    entry = json.load(f)
+                self._programs[entry["shape_key"]] = entry
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[WARNING] Skipping unreadable cached program {name}: {e}")
+
+    def lookup(self, summary):
+        """Cached code blocks for this summary's shape, or None"""
+        key = shape_key(summary)
+        with self._lock:
+            self._counters["lookups"] += 1
+            entry = self._programs.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            return entry["code_blocks"]
+
+    def record_hit(self, summary):
+        key = shape_key(summary)
+        with self._lock:
+            entry = self._programs.get(key)
+            self._counters["hits"] += 1
+            if entry is not None:
+                entry["replays"] += 1
+                self._counters["llm_calls_saved"] += entry.get("llm_calls", 0)
+                self._counters["tokens_saved"] += entry.get("tokens", 0)
+
+    def record_failure(self, summary):
+        """The cached program failed on new data; forget it so the LLM writes a new one"""
+        key = shape_key(summary)
+        with self._lock:
+            self._counters["replay_failures"] += 1
+            self._programs.pop(key, None)
+        try:
+            os.remove(os.path.join(self.root, f"{key}.json"))
+        except FileNotFoundError:
+            pass
+
+    def record_generation(self, llm_calls: int):
+        with self._lock:
+            self._counters["llm_calls"] += llm_calls
+
+    def store(self, summary, code_blocks, llm_calls: int = 0, tokens: int = 0) -> bool:
+        if not is_replayable(code_blocks):
+            return False
+        key = shape_key(summary)
+        entry = {
+            "shape_key": key,
+            "shape": summary_shape(summary),
+            "code_blocks": code_blocks,
+            "llm_calls": llm_calls,
+            "tokens": tokens,
+            "created_at": time.time(),
+            "replays": 0,
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=".program_", dir=self.root)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, f"{key}.json"))
+        with self._lock:
+            self._programs[key] = entry
+            self._counters["stored"] += 1
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["programs"] = len(self._programs)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_program_cache() -> ProgramCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ProgramCache()
+    return _cache
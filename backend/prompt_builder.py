@@ -0,0 +1,225 @@
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import List
+
+from dotenv import load_dotenv
+
+from program_cache import DATA_FILENAME, summary_shape
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts fall back to a characters-per-token estimate
+    tiktoken = None
+
+load_dotenv()
+
+# Tokens for the system message plus the first user message of a CodeGen chat
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+# Small local models get far less room; "model=tokens" pairs in PROMPT_MODEL_BUDGETS override these
+MODEL_PROMPT_BUDGETS = {
+    "gpt-4o": 4000,
+    "deepseek-coder-6.7b-instruct": 1200,
+    "mistralai/mistral-7b-instruct-v0.3": 1200,
+}
+for _pair in filter(None, os.getenv("PROMPT_MODEL_BUDGETS", "").split(",")):
+    _model, _, _tokens = _pair.rpartition("=")
+    MODEL_PROMPT_BUDGETS[_model.strip()] = int(_tokens)
+
+CHARS_PER_TOKEN = 4
+# Only these fields of a summary (and of each result) are useful to the program writer
+SUMMARY_FIELDS = ("player_name", "results")
+RESULT_FIELDS = ("url", "content", "stats")
+
+SYSTEM_MESSAGE = f"""You are a Python coding assistant. Write code that charts cricket statistics.
+
+Reply with a single python block containing the complete program.
+
+RULES:
+- matplotlib, numpy and pandas are installed; never pip install anything
+- import matplotlib; matplotlib.use('Agg') before pyplot (headless sandbox)
+- Load the data with json.load(open('{DATA_FILENAME}')); never hardcode values
+- Per-format numbers are in results[0]['stats'] ({{"Test": {{"matches", "runs", "avg", "centuries"}}, ...}}) when present; otherwise parse the 'content' text for Test, ODI and T20I, removing commas from numbers like "14,181"
+- Handle missing formats and fields gracefully
+- 2x2 grid of bar charts: matches, runs, averages, centuries across the formats, each with a title
+- Put the exact value on top of each bar with ax.text()
+- Save to os.path.abspath('cricket_stats_chart.png') and print progress
+- No emojis or special Unicode characters"""
+
+TASK_TEMPLATE = """Cricket statistics for {player}, saved as '{data_file}' in the current directory{abridged}:
+{data}
+
+Write the program that loads this file and saves the 2x2 chart as 'cricket_stats_chart.png'. TERMINATE when complete."""
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def _encoder(model: str):
+    """tiktoken encoding for a model (cl100k_base for ones it doesn't know), or None"""
+    if tiktoken is None:
+        return None
+    with _encoders_lock:
+        if model not in _encoders:
+            try:
+                try:
+                    _encoders[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encoders[model] = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # The encoding files are fetched on first use; offline, estimate instead
+                print(f"[WARNING] No tiktoken encoding for {model}, estimating tokens: {e}")
+                _encoders[model] = None
+        return _encoders[model]
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoder = _encoder(model)
+    if encoder is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def token_counter(model: str) -> str:
+    return "tiktoken" if _encoder(model) is not None else "estimate"
+
+
+def prompt_budget(model: str) -> int:
+    return MODEL_PROMPT_BUDGETS.get(model, PROMPT_TOKEN_BUDGET)
+
+
+def minify(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+@dataclass
+class CodegenPrompt:
+    system_message: str
+    message: str
+    model: str
+    budget: int
+    tokens: int
+    data_tokens: int
+    counter: str
+    # Pruning steps applied to the data, in order
+    pruned: List[str] = field(default_factory=list)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.tokens > self.budget
+
+
+def _pruned_fields(summary: dict) -> dict:
+    """The summary without fields a plotting program never reads (provenance, raw Tavily extras)"""
+    data = {k: summary[k] for k in SUMMARY_FIELDS if k in summary}
+    results = []
+    for result in summary.get("results") or []:
+        if not isinstance(result, dict):
+            results.append(result)
+            continue
+        result = {k: result[k] for k in RESULT_FIELDS if k in result}
+        if isinstance(result.get("stats"), dict):
+            result["stats"] = {fmt: {k: v for k, v in values.items() if k != "source"}
+                               if isinstance(values, dict) else values
+                               for fmt, values in result["stats"].items()}
+        results.append(result)
+    if "results" in data:
+        data["results"] = results
+    return data
+
+
+def _without_redundant_content(data: dict) -> dict:
+    """Drop 'content' from results whose parsed stats already say the same thing"""
+    results = [{k: v for k, v in r.items() if k != "content"} if isinstance(r, dict) and r.get("stats") else r
+               for r in data.get("results") or []]
+    return {**data, "results": results}
+
+
+def _first_result_only(data: dict) -> dict:
+    return {**data, "results": (data.get("results") or [])[:1]}
+
+
+def _truncate_contents(data: dict, max_chars: int) -> dict:
+    results = []
+    for result in data.get("results") or []:
+        if isinstance(result, dict) and isinstance(result.get("content"), str) and len(result["content"]) > max_chars:
+            result = {**result, "content": result["content"][:max_chars] + "..."}
+        results.append(result)
+    return {**data, "results": results}
+
+
+def _fit_text(text: str, budget: int, model: str) -> str:
+    """Longest prefix of text within budget tokens (binary search on the length)"""
+    if count_tokens(text, model) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle] + "...", model) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + "..."
+
+
+def _fit_data(summary, budget: int, model: str):
+    """Minified data for the prompt within `budget` tokens. Returns (text, pruning steps)"""
+    if not isinstance(summary, dict):
+        text = summary if isinstance(summary, str) else minify(summary)
+        fitted = _fit_text(text, budget, model)
+        return fitted, ([] if fitted == text else ["truncated"])
+
+    steps = ["fields"]
+    data = _pruned_fields(summary)
+    text = minify(data)
+    for step, prune in (("redundant_content", _without_redundant_content), ("extra_results", _first_result_only)):
+        if count_tokens(text, model) <= budget:
+            return text, steps
+        pruned = prune(data)
+        if pruned != data:
+            data, text = pruned, minify(pruned)
+            steps.append(step)
+    if count_tokens(text, model) <= budget:
+        return text, steps
+
+    longest = max((len(r["content"]) for r in data.get("results") or []
+                   if isinstance(r, dict) and isinstance(r.get("content"), str)), default=0)
+    low, high = 0, longest
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(minify(_truncate_contents(data, middle)), model) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    text = minify(_truncate_contents(data, low))
+    if longest:
+        steps.append("truncated")
+    if count_tokens(text, model) <= budget:
+        return text, steps
+    # Still too big: describe the data's shape, the program reads the values from the file anyway
+    steps.append("shape_only")
+    return minify(summary_shape(summary)), steps
+
+
+def build_codegen_prompt(summary, model: str) -> CodegenPrompt:
+    """System message and first user message for a CodeGen chat, sized to the model's token budget.
+
+    The instructions are fixed; the data is minified and pruned step by step
+    (unused fields, content duplicated by parsed stats, extra results,
+    truncated content, shape only) until the whole prompt fits.
+    """
+    budget = prompt_budget(model)
+    player = summary.get("player_name", "the player") if isinstance(summary, dict) else "the player"
+    frame = {"player": player, "data_file": DATA_FILENAME, "abridged": " (abridged below; the file has everything)"}
+    fixed_tokens = count_tokens(SYSTEM_MESSAGE, model) + count_tokens(TASK_TEMPLATE.format(data="", **frame), model)
+
+    data, pruned = _fit_data(summary, max(0, budget - fixed_tokens), model)
+    if pruned in ([], ["fields"]):
+        frame["abridged"] = ""
+    message = TASK_TEMPLATE.format(data=data, **frame)
+    tokens = count_tokens(SYSTEM_MESSAGE, model) + count_tokens(message, model)
+    return CodegenPrompt(SYSTEM_MESSAGE, message, model, budget, tokens, count_tokens(data, model),
+                         token_counter(model), pruned)
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_TTL = float(os.getenv("SEARCH_CACHE_TTL", "86400"))  # seconds
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512"))
+DEFAULT_MAX_DISK_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_DISK_ENTRIES", "5000"))
+DEFAULT_PATH = os.getenv("SEARCH_CACHE_PATH", "./search_cache.sqlite3")
+
+
+def normalize_player_name(player_name: str) -> str:
+    """Cache key for a player: lowercase with whitespace collapsed"""
+    return " ".join(str(player_name).lower().split())
+
+
+class SearchCache():
+    """In-memory LRU with per-entry TTL, backed by a SQLite file that survives restarts.
+
+    Memory holds the hottest `max_entries` players; disk holds up to
+    `max_disk_entries` and evicts the least recently used rows beyond that.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, fetched_at, expires_at)
+        self._counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                          "expired": 0, "refreshes": 0, "evictions": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_access ON search_cache(last_access)")
+            self._db.commit()
+
+    def get(self, player_name: str) -> Optional[Any]:
+        """Return the cached value for a player, or None when missing or stale"""
+        key = normalize_player_name(player_name)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, fetched_at, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._counters["expired"] += 1
+
+            row = self._disk_get(key)
+            if row is not None:
+                value, fetched_at, expires_at = row
+                if expires_at > now:
+                    self._remember(key, value, fetched_at, expires_at)
+                    self._counters["hits"] += 1
+                    self._counters["disk_hits"] += 1
+                    return value
+                self._disk_delete(key)
+                self._counters["expired"] += 1
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, player_name: str, value: Any, ttl: Optional[float] = None):
+        """Store a value for a player; `ttl` overrides the cache default for this entry"""
+        key = normalize_player_name(player_name)
+        fetched_at = time.time()
+        expires_at = fetched_at + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, value, fetched_at, expires_at)
+            self._disk_put(key, value, fetched_at, expires_at)
+
+    def invalidate(self, player_name: str):
+        key = normalize_player_name(player_name)
+        with self._lock:
+            self._memory.pop(key, None)
+            self._disk_delete(key)
+
+    def get_or_fetch(self, player_name: str, fetch: Callable[[], Any], refresh: bool = False) -> Any:
+        """Return the cached value, calling `fetch` on a miss or when `refresh` is set"""
+        if refresh:
+            with self._lock:
+                self._counters["refreshes"] += 1
+        else:
+            cached = self.get(player_name)
+            if cached is not None:
+                return cached
+
+        value = fetch()
+        # Don't pin empty search results for a whole TTL
+        if value:
+            self.set(player_name, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+            counters["disk_entries"] = self._disk_count()
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        return counters
+
+    # --- internal helpers (caller holds self._lock) ---
+
+    def _remember(self, key, value, fetched_at, expires_at):
+        self._memory[key] = (value, fetched_at, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_get(self, key):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT value, fetched_at, expires_at FROM search_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return json.loads(row[0]), row[1], row[2]
+
+    def _disk_put(self, key, value, fetched_at, expires_at):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO search_cache (key, value, fetched_at, expires_at, last_access)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(value), fetched_at, expires_at, fetched_at),
+        )
+        overflow = self._disk_count() - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM search_cache WHERE key IN"
+                " (SELECT key FROM search_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._counters["evictions"] += overflow
+        self._db.commit()
+
+    def _disk_delete(self, key):
+        if self._db is None:
+            return
+        self._db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+        self._db.commit()
+
+    def _disk_count(self) -> int:
+        if self._db is None:
+            return 0
+        return self._db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Shared cache instance, opened on first use"""
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache()
+    return _search_cache
@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+
+
+class SingleFlight():
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the coroutine; callers arriving while it
+    is in flight await the same task and receive the same result (or error).
+    Nothing is cached once the call completes. The shared task is shielded,
+    so one caller disconnecting doesn't cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> [task, waiters]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `fn()` once per in-flight key. Returns (result, shared)"""
+        call = self._calls.get(key)
+        if call is not None:
+            call[1] += 1
+            return await asyncio.shield(call[0]), True
+
+        task = asyncio.ensure_future(fn())
+        call = [task, 0]
+        self._calls[key] = call
+
+        def _forget(_):
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+        task.add_done_callback(_forget)
+        result = await asyncio.shield(task)
+        return result, call[1] > 0
+
+    def in_flight(self) -> int:
+        return len(self._calls)
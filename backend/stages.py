@@ -0,0 +1,50 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-stage concurrency limits for the get_stats pipeline
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "8"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+SANDBOX_CONCURRENCY = int(os.getenv("SANDBOX_CONCURRENCY", "2"))
+
+# Each stage runs on its own thread pool, so a chart run stuck in a long
+# chat or container can never occupy the threads search traffic needs.
+# A chart run alternates between LLM turns and sandbox executions, so its
+# pool is sized to keep both limits busy.
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY, thread_name_prefix="search")
+CHART_WORKERS = LLM_CONCURRENCY + SANDBOX_CONCURRENCY
+_chart_pool = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix="chart")
+
+# Held by chart threads around each LLM turn. Sandbox executions are bounded
+# by the executor pool, whose max size defaults to SANDBOX_CONCURRENCY.
+llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
+
+async def _run_in(pool, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry context variables into the worker thread like asyncio.to_thread does
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(pool, call)
+
+
+async def run_search(fn, *args, **kwargs):
+    """Run a blocking search-stage call (Tavily, parsing) off the event loop"""
+    return await _run_in(_search_pool, fn, *args, **kwargs)
+
+
+async def run_chart(fn, *args, **kwargs):
+    """Run a blocking chart-stage call (LLM chat + sandbox) off the event loop"""
+    return await _run_in(_chart_pool, fn, *args, **kwargs)
+
+
+def shutdown():
+    _search_pool.shutdown(wait=False, cancel_futures=True)
+    _chart_pool.shutdown(wait=False, cancel_futures=True)
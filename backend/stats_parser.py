@@ -0,0 +1,195 @@
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+FORMATS = ("Test", "ODI", "T20I")
+
+# All patterns are compiled once and only ever applied to a single line or
+# cell, with bounded gaps, so parse time stays linear in the page size.
+_NUMBER_COMMAS = re.compile(r'(?<=\d),(?=\d{3}\b)')
+_FORMAT_CELL = re.compile(r'^(Test|ODI|T20I)s?\b')
+_INT = re.compile(r'^\d+$')
+_DECIMAL = re.compile(r'^\d+\.\d+$')
+_NUMERIC = re.compile(r'^\d+(?:\.\d+)?$')
+_PAIR = re.compile(r'^(\d+)\s*/\s*(\d+)$')
+# "Test: 113 matches, 8848 runs, avg 49.15, 29 centuries" and similar prose
+_INLINE = re.compile(
+    r'\b(Test|ODI|T20I)s?\b[^\d\n]{0,40}?(\d+)[^\d\n]{1,40}?(\d{3,5})[^\d\n]{1,40}?(\d+(?:\.\d+)?)[^\d\n]{1,40}?(\d+)'
+)
+
+# Header cell text -> field, for tables that label their columns
+_HEADER_FIELDS = {
+    "m": "matches", "mat": "matches", "mats": "matches", "matches": "matches",
+    "inn": "innings", "inns": "innings", "innings": "innings",
+    "r": "runs", "runs": "runs", "runs scored": "runs",
+    "ave": "avg", "avg": "avg", "average": "avg", "batting average": "avg",
+    "100": "centuries", "100s": "centuries", "hundreds": "centuries", "centuries": "centuries",
+    "100s/50s": "centuries_first", "100/50": "centuries_first",
+    "50s/100s": "centuries_second", "50/100": "centuries_second",
+}
+# Columns that only appear in bowling tables, whose Runs/Ave mean something else
+_BOWLING_HEADERS = {"wkts", "wickets", "w", "balls", "econ", "economy", "bbi", "bbm", "5w", "10w"}
+
+
+@dataclass
+class Provenance:
+    url: Optional[str]
+    line: int
+    method: str  # "table-header", "table" (positional) or "inline"
+
+
+@dataclass
+class FormatStats:
+    matches: Optional[int] = None
+    runs: Optional[int] = None
+    avg: Optional[float] = None
+    centuries: Optional[int] = None
+    innings: Optional[int] = None
+    source: Optional[Provenance] = None
+
+    def field_count(self) -> int:
+        return sum(v is not None for v in (self.matches, self.runs, self.avg, self.centuries))
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+@dataclass
+class CareerStats:
+    formats: Dict[str, FormatStats] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.formats)
+
+    def to_dict(self) -> dict:
+        """Compact typed record: {"Test": {"matches": 113, "runs": 8848, ...}, ...}"""
+        return {fmt: self.formats[fmt].to_dict() for fmt in FORMATS if fmt in self.formats}
+
+    def summary_line(self) -> str:
+        """Human-readable one-liner, in the format the frontend and CodeGen prompt expect"""
+        if not self.formats:
+            return ""
+        parts = []
+        for fmt in FORMATS:
+            stats = self.formats.get(fmt)
+            if stats is None:
+                continue
+            matches = stats.matches if stats.matches is not None else 0
+            runs = stats.runs if stats.runs is not None else 0
+            avg = f"{stats.avg:.2f}" if stats.avg is not None else "0.0"
+            centuries = stats.centuries if stats.centuries is not None else 0
+            parts.append(f"{fmt}: {matches} matches, {runs} runs, avg {avg}, {centuries} centuries")
+        return f"Career statistics: {'. '.join(parts)}."
+
+
+def _classify_header(cells):
+    """("batting", column index -> field) or ("bowling", None) for a table header row, else None"""
+    lowered = [cell.lower().strip("* ") for cell in cells]
+    if any(cell in _BOWLING_HEADERS for cell in lowered):
+        return "bowling", None
+    mapping = {}
+    for i, cell in enumerate(lowered):
+        name = _HEADER_FIELDS.get(cell)
+        if name is not None and name not in mapping.values():
+            mapping[i] = name
+    # A header needs at least two stats columns, and runs or matches among them
+    if len(mapping) >= 2 and ("runs" in mapping.values() or "matches" in mapping.values()):
+        return "batting", mapping
+    return None
+
+
+def _row_from_header(cells, header) -> FormatStats:
+    stats = FormatStats()
+    for i, name in header.items():
+        if i >= len(cells):
+            continue
+        cell = cells[i].rstrip("*")
+        if name in ("matches", "innings", "runs", "centuries") and _INT.match(cell):
+            setattr(stats, name, int(cell))
+        elif name == "avg" and _NUMERIC.match(cell):
+            stats.avg = float(cell)
+        elif name in ("centuries_first", "centuries_second"):
+            pair = _PAIR.match(cell)
+            if pair:
+                stats.centuries = int(pair.group(1 if name == "centuries_first" else 2))
+    return stats
+
+
+def _row_from_positions(cells) -> FormatStats:
+    """Headerless rows: format | matches | ... | runs | ... | average, with centuries as an "a/b" cell"""
+    stats = FormatStats()
+    if len(cells) > 1 and _INT.match(cells[1]):
+        stats.matches = int(cells[1])
+    for i in (3, 4):
+        if len(cells) > i and _NUMERIC.match(cells[i]):
+            runs = int(float(cells[i]))
+            if 100 <= runs <= 25000:  # Reasonable range
+                stats.runs = runs
+                break
+    for i in (5, 6, 7):
+        if len(cells) > i and _DECIMAL.match(cells[i].replace(" ", "")):
+            avg = float(cells[i].replace(" ", ""))
+            if 10.0 <= avg <= 70.0:  # Reasonable batting average
+                stats.avg = avg
+                break
+    for cell in cells:
+        pair = _PAIR.match(cell)
+        if pair and 0 <= int(pair.group(2)) <= 80:  # Reasonable centuries count
+            stats.centuries = int(pair.group(2))
+            break
+    return stats
+
+
+def parse_career_stats(content: str, url: Optional[str] = None) -> CareerStats:
+    """Single pass over a scraped page, returning per-format batting stats.
+
+    Table rows win over prose; within each, the first usable row for a
+    format is kept. Prose matches are only used when no table rows parse.
+    """
+    table = {}
+    inline = {}
+    header = None
+
+    for line_no, raw in enumerate(content.splitlines(), start=1):
+        if "|" in raw:
+            line = _NUMBER_COMMAS.sub("", raw)
+            cells = [c.strip() for c in line.strip().strip("|").split("|")]
+            format_match = _FORMAT_CELL.match(cells[0])
+            if format_match is None:
+                header = _classify_header(cells) or header
+                continue
+            fmt = format_match.group(1)
+            if fmt in table or len(cells) < 4:
+                continue
+            if header is None:
+                stats = _row_from_positions(cells)
+                method = "table"
+            elif header[0] == "batting":
+                stats = _row_from_header(cells, header[1])
+                method = "table-header"
+            else:
+                continue
+            # Store if we have meaningful data
+            if stats.field_count() >= 2:
+                stats.source = Provenance(url=url, line=line_no, method=method)
+                table[fmt] = stats
+            continue
+
+        if raw.strip():
+            # Prose between tables ends the current header's scope
+            header = None
+        if len(inline) < len(FORMATS) and ("Test" in raw or "ODI" in raw or "T20I" in raw):
+            line = _NUMBER_COMMAS.sub("", raw)
+            for match in _INLINE.finditer(line):
+                fmt = match.group(1)
+                if fmt in inline:
+                    continue
+                inline[fmt] = FormatStats(
+                    matches=int(match.group(2)),
+                    runs=int(match.group(3)),
+                    avg=float(match.group(4)),
+                    centuries=int(match.group(5)),
+                    source=Provenance(url=url, line=line_no, method="inline"),
+                )
+
+    return CareerStats(formats=table or inline)
@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATS_STORE_PATH = os.getenv("STATS_STORE_PATH", "./player_stats.sqlite3")
+# Served straight from the store while younger than this (seconds)
+STATS_FRESH_TTL = float(os.getenv("STATS_FRESH_TTL", "21600"))
+# Older entries are still served, with a background refresh, up to this age
+STATS_MAX_STALE = float(os.getenv("STATS_MAX_STALE", "604800"))
+STATS_STORE_MAX_MEMORY = int(os.getenv("STATS_STORE_MAX_MEMORY", "2048"))
+
+
+@dataclass
+class StoredStats:
+    player_key: str
+    summary: dict
+    source_urls: dict  # format -> URL its stats were parsed from
+    fetched_at: float
+    fresh_ttl: float
+    max_stale: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    @property
+    def fresh(self) -> bool:
+        return self.age < self.fresh_ttl
+
+    @property
+    def usable(self) -> bool:
+        """Fresh, or stale but young enough to serve while it is refreshed"""
+        return self.age < self.max_stale
+
+
+def typed_stats(summary) -> dict:
+    """The parsed per-format record of a compact summary, or {} if it has none"""
+    try:
+        stats = summary["results"][0].get("stats")
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return {}
+    return stats if isinstance(stats, dict) else {}
+
+
+def source_urls(stats: dict) -> dict:
+    """Per format, the URL its stats were parsed from; merged searches can take each format from another page"""
+    urls = {}
+    for fmt, record in stats.items():
+        source = record.get("source") if isinstance(record, dict) else None
+        if isinstance(source, dict) and source.get("url"):
+            urls[fmt] = source["url"]
+    return urls
+
+
+class StatsStore():
+    """Parsed per-format player stats in SQLite, indexed by normalized player name.
+
+    Only summaries whose stats parsed are stored, along with the source URL
+    of each format and the fetch time; freshness is decided by the caller from
+    `StoredStats.fresh` / `usable`. Recently read entries are also kept in
+    an in-memory LRU so repeat lookups don't touch the database.
+    """
+
+    def __init__(self, path=STATS_STORE_PATH, fresh_ttl=STATS_FRESH_TTL,
+                 max_stale=STATS_MAX_STALE, max_memory=STATS_STORE_MAX_MEMORY):
+        self.path = path
+        self.fresh_ttl = fresh_ttl
+        self.max_stale = max(max_stale, fresh_ttl)
+        self.max_memory = max_memory
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # player_key -> StoredStats
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "writes": 0, "skipped_writes": 0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS player_stats ("
+            " player_key TEXT PRIMARY KEY, player_name TEXT, stats TEXT NOT NULL,"
+            " summary TEXT NOT NULL, source_urls TEXT, fetched_at REAL NOT NULL)"
+        )
+        # Stores created before per-format sources had a single source_url column, left unused
+        if "source_urls" not in {row[1] for row in self._db.execute("PRAGMA table_info(player_stats)")}:
+            self._db.execute("ALTER TABLE player_stats ADD COLUMN source_urls TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_player_stats_fetched ON player_stats(fetched_at)")
+        self._db.commit()
+
+    def get(self, player_key: str) -> Optional[StoredStats]:
+        """Stored stats for a player regardless of age, or None"""
+        with self._lock:
+            entry = self._memory.get(player_key)
+            if entry is not None:
+                self._memory.move_to_end(player_key)
+            else:
+                row = self._db.execute(
+                    "SELECT summary, source_urls, fetched_at FROM player_stats WHERE player_key = ?",
+                    (player_key,),
+                ).fetchone()
+                if row is not None:
+                    entry = StoredStats(player_key, json.loads(row[0]), json.loads(row[1] or "{}"), row[2],
+                                        self.fresh_ttl, self.max_stale)
+                    self._remember(entry)
+
+            if entry is None or not entry.usable:
+                self._counters["misses"] += 1
+                return entry
+            self._counters["hits" if entry.fresh else "stale_hits"] += 1
+            return entry
+
+    def put(self, player_key: str, summary: dict, player_name: Optional[str] = None) -> bool:
+        """Store a compact summary if its stats parsed; returns whether it was stored"""
+        stats = typed_stats(summary)
+        if not stats:
+            with self._lock:
+                self._counters["skipped_writes"] += 1
+            return False
+        urls = source_urls(stats)
+        entry = StoredStats(player_key, summary, urls, time.time(), self.fresh_ttl, self.max_stale)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO player_stats (player_key, player_name, stats, summary, source_urls, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (player_key, player_name or summary.get("player_name"), json.dumps(stats),
+                 json.dumps(summary), json.dumps(urls), entry.fetched_at),
+            )
+            self._db.commit()
+            self._remember(entry)
+            self._counters["writes"] += 1
+        return True
+
+    def put_many(self, entries) -> int:
+        """Store (player_key, summary, player_name) entries in one transaction; returns how many were stored.
+
+        For bulk loads: summaries without parsed stats are skipped, and the
+        entries are not pulled into the memory LRU.
+        """
+        rows = []
+        now = time.time()
+        for player_key, summary, player_name in entries:
+            stats = typed_stats(summary)
+            if stats:
+                rows.append((player_key, player_name or summary.get("player_name"), json.dumps(stats),
+                             json.dumps(summary), json.dumps(source_urls(stats)), now))
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO player_stats (player_key, player_name, stats, summary, source_urls, fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            for row in rows:
+                self._memory.pop(row[0], None)
+            self._counters["writes"] += len(rows)
+            self._counters["skipped_writes"] += len(entries) - len(rows)
+        return len(rows)
+
+    def players(self) -> list:
+        """(player_key, player_name) for every stored player"""
+        with self._lock:
+            rows = self._db.execute("SELECT player_key, player_name FROM player_stats").fetchall()
+        return [(key, name or key) for key, name in rows]
+
+    def invalidate(self, player_key: str):
+        with self._lock:
+            self._memory.pop(player_key, None)
+            self._db.execute("DELETE FROM player_stats WHERE player_key = ?", (player_key,))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._memory)
+            counters["entries"] = self._db.execute("SELECT COUNT(*) FROM player_stats").fetchone()[0]
+            counters["stale_entries"] = self._db.execute(
+                "SELECT COUNT(*) FROM player_stats WHERE fetched_at < ?", (time.time() - self.fresh_ttl,)
+            ).fetchone()[0]
+        lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["hits"] + counters["stale_hits"]) / lookups, 4) if lookups else 0.0
+        return counters
+
+    def _remember(self, entry: StoredStats):
+        # caller holds self._lock
+        self._memory[entry.player_key] = entry
+        self._memory.move_to_end(entry.player_key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_stats_store() -> StatsStore:
+    """Shared store instance, opened on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = StatsStore()
+    return _store
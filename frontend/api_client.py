@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+BACKEND_URL = os.getenv(
+    "BACKEND_URL", f"http://{os.getenv('BACKEND_HOST', 'localhost')}:{os.getenv('BACKEND_PORT', '8000')}"
+).rstrip("/")
+CONNECT_TIMEOUT = float(os.getenv("FRONTEND_CONNECT_TIMEOUT", "3.05"))
+# Longest silence between two stream events; a CodeGen chart can take minutes
+READ_TIMEOUT = float(os.getenv("FRONTEND_READ_TIMEOUT", "300"))
+# Finished lookups are shown again without asking the backend for this long (seconds)
+RESPONSE_CACHE_TTL = float(os.getenv("FRONTEND_CACHE_TTL", "600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("FRONTEND_CACHE_MAX_ENTRIES", "256"))
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("FRONTEND_CHART_CACHE_MAX_ENTRIES", "64"))
+POOL_SIZE = 16
+
+
+def player_key(player_name: str) -> str:
+    return re.sub(r"\s+", " ", player_name).strip().lower()
+
+
+class TTLCache():
+    """Small thread-safe LRU; entries are fresh for `ttl` seconds, then kept (stale) until evicted"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+
+    def get(self, key):
+        """The value while fresh, else None"""
+        value, fresh = self.peek(key)
+        return value if fresh else None
+
+    def peek(self, key):
+        """(value, fresh) regardless of age; (None, False) if absent"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(key)
+            return entry[1], time.monotonic() - entry[0] <= self.ttl
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class BackendClient():
+    """HTTP client for the stats API, shared by every Streamlit session in the process.
+
+    One pooled keep-alive session with connect/read timeouts; finished
+    lookups are cached per player for RESPONSE_CACHE_TTL, and chart bytes
+    are fetched from /charts and revalidated with If-None-Match once stale.
+    """
+
+    def __init__(self, base_url: str = BACKEND_URL, ttl: float = RESPONSE_CACHE_TTL):
+        self.base_url = base_url
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        self.session = requests.Session()
+        # Only connection failures are retried; a started lookup is never sent twice
+        retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.responses = TTLCache(ttl, RESPONSE_CACHE_MAX_ENTRIES)
+        # Chart ids are content digests, so a cached chart only needs revalidating, never re-keying;
+        # entries outlive the TTL and are checked with a conditional request once it has passed
+        self.charts = TTLCache(ttl, CHART_CACHE_MAX_ENTRIES)
+
+    @staticmethod
+    def _response_key(player_name: str, exact: bool) -> str:
+        # A name searched as typed may resolve differently from the same name resolved by the backend
+        return f"{player_key(player_name)}|exact" if exact else player_key(player_name)
+
+    def cached_stats(self, player_name: str, exact: bool = False) -> Optional[dict]:
+        return self.responses.get(self._response_key(player_name, exact))
+
+    def forget(self, player_name: str, exact: bool = False):
+        self.responses.pop(self._response_key(player_name, exact))
+
+    def stream_stats(self, player_name: str, refresh: bool = False, exact: bool = False) -> Iterator[dict]:
+        """Stage events from /get_stats/stream; a finished lookup is cached for the next view.
+
+        exact=True searches the name as typed instead of resolving it to a
+        known player. Raises requests.HTTPError for non-200 responses.
+        """
+        result = {"player_name": player_name, "statistics": None, "chart_url": None, "chart_id": None}
+        complete = True
+        with self.session.get(f"{self.base_url}/get_stats/stream", timeout=self.timeout, stream=True,
+                              params={"player_name": player_name, "refresh": str(refresh).lower(),
+                                      "exact": str(exact).lower()}) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                kind = event.get("event")
+                if kind == "search_done":
+                    result["statistics"] = event.get("statistics")
+                elif kind == "chart_ready":
+                    result["chart_url"] = event.get("chart_url")
+                    result["chart_id"] = event.get("chart_id")
+                elif kind in ("error", "ambiguous", "chart_shed"):
+                    # A chart left out under load is worth asking for again soon, so don't cache without it
+                    complete = False
+                elif kind == "done" and complete and result["statistics"]:
+                    self.responses.put(self._response_key(player_name, exact), result)
+                yield event
+
+    def fetch_chart(self, chart_url: str, variant: Optional[str] = None) -> Optional[bytes]:
+        """Chart bytes through the API; served from memory while fresh, revalidated with its ETag after.
+
+        `variant` asks for a smaller rendition (thumb, medium, webp, png, svg)
+        instead of the full-size PNG.
+        """
+        url = f"{chart_url}?variant={variant}" if variant else chart_url
+        cached, fresh = self.charts.peek(url)
+        if fresh:
+            return cached["data"]
+
+        headers = {"If-None-Match": cached["etag"]} if cached and cached.get("etag") else {}
+        response = self.session.get(f"{self.base_url}{url}", headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            self.charts.put(url, cached)
+            return cached["data"]
+        if response.status_code == 404:
+            self.charts.pop(url)
+            return None
+        response.raise_for_status()
+        self.charts.put(url, {"etag": response.headers.get("ETag"), "data": response.content})
+        return response.content
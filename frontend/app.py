@@ -1,7 +1,8 @@
 import streamlit as st
 import requests
-import os
-from pathlib import Path
+import time
+
+from api_client import BACKEND_URL, BackendClient
 
 # Configure Streamlit page
 st.set_page_config(
@@ -28,104 +29,145 @@ with col1:
 with col2:
     st.write("")  # Space for alignment
     get_stats = st.button("🔍 Get Stats", type="primary", use_container_width=True)
+    refresh = st.checkbox("🔄 Refresh", help="Skip cached results and search again")
+
+
+@st.cache_resource
+def get_client():
+    """One pooled API client (and response cache) for every session of this server"""
+    return BackendClient()
+
+
+client = get_client()
+
+
+def choose_player(name, exact=False):
+    """Button callback: look up a picked candidate (or the name as typed, with exact) on the next run"""
+    st.session_state["chosen_player"] = {"name": name, "exact": exact}
+
+
+# A name that matched several players is looked up again once the user picks one
+chosen = st.session_state.pop("chosen_player", None)
+exact = False
+if chosen:
+    get_stats, player_name, exact = True, chosen["name"], chosen["exact"]
+
+
+def show_statistics(statistics):
+    if statistics and statistics.get("results"):
+        stats_content = statistics["results"][0].get("content", "")
+        if stats_content:
+            st.markdown("### 📊 Cricket Statistics")
+            st.text(stats_content)
+
+
+def show_chart(chart_url, player_name):
+    """Display a finished chart, fetched from the backend's /charts endpoint"""
+    st.markdown("### 📈 Statistical Visualization")
+    try:
+        # An 800px WebP is plenty on screen; the download gets the full-size optimized PNG
+        preview_bytes = client.fetch_chart(chart_url, variant="medium") if chart_url else None
+        chart_bytes = client.fetch_chart(chart_url, variant="png") if preview_bytes else None
+    except requests.exceptions.RequestException as e:
+        st.error(f"❌ Could not download the chart: {str(e)}")
+        return False
+    if chart_bytes is None:
+        st.warning("⚠️ Chart was generated but is no longer available. Tick Refresh to generate it again.")
+        return False
+
+    st.image(
+        preview_bytes,
+        caption=f"Cricket Statistics Chart for {player_name}",
+        use_column_width=True
+    )
+
+    # Add download button
+    st.download_button(
+        label="💾 Download Chart",
+        data=chart_bytes,
+        file_name=f"{player_name.replace(' ', '_')}_cricket_stats.png",
+        mime="image/png",
+        type="secondary",
+        help="Download the generated cricket statistics chart"
+    )
+    return True
+
+
+# Progress messages for the backend's stage events
+STAGE_MESSAGES = {
+    "search_started": "🔍 Searching cricket statistics...",
+    "render_started": "📈 Generating chart...",
+    "code_generated": "🤖 Chart code generated, preparing the sandbox...",
+    "sandbox_running": "🐳 Running chart code in the sandbox...",
+    "sandbox_finished": "🐳 Sandbox run finished, collecting the chart...",
+}
+
+cached = client.cached_stats(player_name, exact) if get_stats and player_name and not refresh else None
+
+if cached:
+    # Seen recently: render from the client-side cache without asking the backend
+    started = time.perf_counter()
+    show_statistics(cached["statistics"])
+    if cached["chart_url"]:
+        show_chart(cached["chart_url"], player_name)
+    st.success(f"✅ Cached result for {player_name} ({(time.perf_counter() - started) * 1000:.0f} ms). "
+               "Tick Refresh to search again.")
+
+elif get_stats and player_name:
+    status = st.empty()
+    stats_area = st.container()
+    chart_area = st.container()
+    events = []
+    try:
+        status.info(f"🔍 Generating cricket statistics and chart for {player_name}...")
+        # Stream stage events, so the statistics show up before the chart is done
+        for event in client.stream_stats(player_name, refresh=refresh, exact=exact):
+            events.append(event)
+            kind = event.get("event")
+
+            if kind in STAGE_MESSAGES:
+                status.info(STAGE_MESSAGES[kind])
+            elif kind == "search_done":
+                # Display statistics text
+                with stats_area:
+                    show_statistics(event.get("statistics"))
+                status.info("📈 Statistics ready, generating chart...")
+            elif kind == "chart_ready":
+                with chart_area:
+                    show_chart(event.get("chart_url"), player_name)
+            elif kind == "chart_failed":
+                with chart_area:
+                    st.warning("⚠️ Chart generation completed but no chart file was created. The statistics are available above.")
+            elif kind == "chart_shed":
+                with chart_area:
+                    st.warning(f"⚠️ {event.get('message', 'Chart generation is busy')}. The statistics are available "
+                               f"above; click Get Stats again in {event.get('retry_after', 60)}s for the chart.")
+            elif kind == "ambiguous":
+                query = event.get("query", player_name)
+                st.warning(f"⚠️ \"{query}\" matches more than one known player. Pick one, or search the name as typed.")
+                for candidate in event.get("candidates", []):
+                    st.button(candidate["player_name"], key=f"candidate_{candidate['player_key']}",
+                              on_click=choose_player, args=(candidate["player_name"],))
+                st.button(f"🔍 Search \"{query}\" as typed", key="candidate_as_typed",
+                          on_click=choose_player, args=(query, True))
+            elif kind == "error":
+                st.error(f"❌ {event.get('message', 'Request failed')}")
+            elif kind == "done":
+                status.success(f"✅ Process completed for {player_name}!")
+
+        # Show raw events in expandable section for debugging
+        with st.expander("🔍 Raw API Events", expanded=False):
+            st.json(events)
 
-if get_stats and player_name:
-    with st.spinner(f"🔍 Generating cricket statistics and chart for {player_name}..."):
-        try:
-            # Make API request to backend
-            response = requests.get(f"http://localhost:8000/get_stats?player_name={player_name}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Check if execution completed
-                if data.get("execution_completed"):
-                    st.success(f"✅ {data.get('message', 'Process completed!')}")
-                    
-                    # Display statistics text
-                    if data.get("statistics") and data["statistics"].get("results"):
-                        stats_content = data["statistics"]["results"][0].get("content", "")
-                        if stats_content:
-                            st.markdown("### 📊 Cricket Statistics")
-                            st.text(stats_content)
-                    
-                    # Check if chart was generated and read it directly from file
-                    if data.get("chart_generated"):
-                        st.markdown("### 📈 Statistical Visualization")
-                        
-                        # Define possible chart file locations (relative to frontend)
-                        chart_locations = [
-                            "../backend/docker_tmp/cricket_stats_chart.png",
-                            "../../backend/docker_tmp/cricket_stats_chart.png",
-                            "../cric_stats_llm/backend/docker_tmp/cricket_stats_chart.png",
-                            "cric_stats_llm/backend/docker_tmp/cricket_stats_chart.png",
-                            # Absolute path based on working directory
-                            os.path.join(os.getcwd(), "cric_stats_llm", "backend", "docker_tmp", "cricket_stats_chart.png"),
-                            os.path.join(os.getcwd(), "backend", "docker_tmp", "cricket_stats_chart.png")
-                        ]
-                        
-                        # Try to find and read the chart file
-                        chart_found = False
-                        for chart_path in chart_locations:
-                            try:
-                                if os.path.exists(chart_path):
-                                    # Read the chart file directly
-                                    with open(chart_path, "rb") as chart_file:
-                                        chart_bytes = chart_file.read()
-                                    
-                                    # Display the chart
-                                    st.image(
-                                        chart_bytes, 
-                                        caption=f"Cricket Statistics Chart for {player_name}",
-                                        use_column_width=True
-                                    )
-                                    
-                                    # Add download button
-                                    st.download_button(
-                                        label="💾 Download Chart",
-                                        data=chart_bytes,
-                                        file_name=f"{player_name.replace(' ', '_')}_cricket_stats.png",
-                                        mime="image/png",
-                                        type="secondary",
-                                        help="Download the generated cricket statistics chart"
-                                    )
-                                    
-                                    st.success(f"📊 Chart successfully loaded from: {chart_path}")
-                                    chart_found = True
-                                    break
-                                    
-                            except Exception as e:
-                                st.error(f"Error reading chart from {chart_path}: {str(e)}")
-                                continue
-                        
-                        if not chart_found:
-                            st.warning("⚠️ Chart was generated but could not be found at expected locations.")
-                            st.info("💡 **Possible locations searched:**")
-                            for location in chart_locations:
-                                exists = "✅" if os.path.exists(location) else "❌"
-                                st.text(f"{exists} {location}")
-                            
-                    elif data.get("execution_completed") and not data.get("chart_generated"):
-                        st.warning("⚠️ Chart generation completed but no chart file was created. The statistics are available above.")
-                    
-                    # Show raw response in expandable section for debugging
-                    with st.expander("🔍 Raw API Response", expanded=False):
-                        st.json(data)
-                
-                else:
-                    st.error("❌ Execution did not complete successfully.")
-                    st.json(data)
-            
-            else:
-                st.error(f"❌ Server error (Status: {response.status_code})")
-                st.text(response.text)
-                
-        except requests.exceptions.ConnectionError:
-            st.error("❌ Cannot connect to backend server. Please ensure it's running on http://localhost:8000")
-        except requests.exceptions.Timeout:
-            st.error("❌ Request timed out. Chart generation may take some time.")
-        except Exception as e:
-            st.error(f"❌ Unexpected error: {str(e)}")
+    except requests.exceptions.HTTPError as e:
+        st.error(f"❌ Server error (Status: {e.response.status_code})")
+        st.text(e.response.text)
+    except requests.exceptions.ConnectionError:
+        st.error(f"❌ Cannot connect to backend server. Please ensure it's running on {BACKEND_URL}")
+    except requests.exceptions.Timeout:
+        st.error("❌ Request timed out. Chart generation may take some time.")
+    except Exception as e:
+        st.error(f"❌ Unexpected error: {str(e)}")
 
 elif get_stats and not player_name:
     st.warning("⚠️ Please enter a player name first.")